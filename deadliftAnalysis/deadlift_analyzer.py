@@ -13,6 +13,9 @@ from datetime import datetime
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
 
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
 # NSCA Deadlift Standards
 NSCA_STANDARDS = {
     "back_angle_start": {"optimal": 45, "range": (40, 50)},
@@ -101,6 +104,8 @@ def analyze_deadlift_video(video_path):
     rep_count = 0
     warning_flags = []
     
+    canvas = None
+    
     # Setup MediaPipe
     with mp_pose.Pose(
         min_detection_confidence=0.5,
@@ -120,12 +125,17 @@ def analyze_deadlift_video(video_path):
                 
                 frame_count += 1
                 
-                # Process frame
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-                results = pose.process(image)
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                # Process frame: the pose model gets an RGB copy, while drawing and
+                # the preview use the decoded BGR frame directly
+                results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                
+                # Output canvas, reused every frame: the frame is copied into its top rows
+                # and the info panel is drawn into the bottom rows
+                frame_h, frame_w = frame.shape[:2]
+                if canvas is None:
+                    canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                image = canvas[:frame_h]
+                image[:] = frame
                 
                 if results.pose_landmarks:
                     # Draw skeleton
@@ -224,7 +234,7 @@ def analyze_deadlift_video(video_path):
                     image = add_deadlift_overlays_safe(image, angles, lift_phase, rep_count, width, height)
                 
                 # Add info panel
-                image = add_deadlift_info_panel_safe(image, frame_count, total_frames, fps, 
+                image = add_deadlift_info_panel_safe(canvas, frame_count, total_frames, fps, 
                                                    rep_count, lift_phase, warning_flags, width, height)
                 
                 # Show live preview
@@ -426,23 +436,17 @@ def add_deadlift_overlays_safe(image, angles, phase, rep_count, width, height):
     return image
 
 def add_deadlift_info_panel_safe(image, frame, total_frames, fps, reps, phase, warnings, width, height):
-    """Safe info panel"""
-    h, w = image.shape[:2]
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
     
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
-    panel[:, :] = (40, 40, 40)
-    
-    # Add panel
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Fill bottom panel
+    image[new_h - PANEL_HEIGHT:] = (40, 40, 40)
     
     # Basic info
     time_sec = frame / fps if fps > 0 else 0
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    cv2.putText(image_with_panel, f"Time: {time_sec:.1f}s", 
+    cv2.putText(image, f"Time: {time_sec:.1f}s", 
                (20, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
     # Phase and reps
@@ -453,9 +457,9 @@ def add_deadlift_info_panel_safe(image, frame, total_frames, fps, reps, phase, w
         "lower": (255, 165, 0)
     }.get(phase, (255, 255, 255))
     
-    cv2.putText(image_with_panel, f"Phase: {phase.upper()}", 
+    cv2.putText(image, f"Phase: {phase.upper()}", 
                (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, phase_color, 2)
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
+    cv2.putText(image, f"Reps: {reps}", 
                (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     
     # Last warning
@@ -463,10 +467,10 @@ def add_deadlift_info_panel_safe(image, frame, total_frames, fps, reps, phase, w
         last_warning = warnings[-1] if isinstance(warnings[-1], str) else str(warnings[-1])
         if len(last_warning) > 40:
             last_warning = last_warning[:37] + "..."
-        cv2.putText(image_with_panel, f"Last: {last_warning}", 
+        cv2.putText(image, f"Last: {last_warning}", 
                    (20, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
     
-    return image_with_panel
+    return image
 
 def generate_deadlift_feedback_safe(rep_data, video_path, warnings):
     """Safe feedback generation"""
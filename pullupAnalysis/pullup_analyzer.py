@@ -8,11 +8,19 @@ import mediapipe as mp
 import numpy as np
 import os
 from datetime import datetime
+import sys
+
+# Output encoding is shared with the web backend's analyzers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from core.video_writer import VideoWriter
 
 # Initialize MediaPipe
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
 
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
 # NSCA Pull-Up Standards
 NSCA_STANDARDS = {
     "elbow_angle_start": {"optimal": 175, "range": (170, 180)},  # Full extension
@@ -134,44 +142,38 @@ def add_metric_overlays(image, metrics):
     return image
 
 def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle, chin_over_bar):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
-    panel[:, :] = (40, 40, 40)
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Fill bottom panel
+    image[new_h - PANEL_HEIGHT:] = (40, 40, 40)
     
     # Add info
     time_sec = frame / fps if fps > 0 else 0
     
     # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
     # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
+    cv2.putText(image, f"Reps: {reps}", 
                (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Elbow: {current_elbow_angle}", 
+    cv2.putText(image, f"Elbow: {current_elbow_angle}", 
                (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
     # Right side: NSCA standard
-    cv2.putText(image_with_panel, "NSCA Standard:", 
+    cv2.putText(image, "NSCA Standard:", 
                (w - 280, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, "• Chin over bar", 
+    cv2.putText(image, "• Chin over bar", 
                (w - 280, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Full arm extension", 
+    cv2.putText(image, "• Full arm extension", 
                (w - 280, new_h - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Controlled movement", 
+    cv2.putText(image, "• Controlled movement", 
                (w - 280, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
     
-    return image_with_panel
+    return image
 
-def analyze_pullup_video(video_path, output_path=None):
+def analyze_pullup_video(video_path, output_path=None, model_complexity=0):
     """
     Main analysis function for pull-ups
     Returns: Dictionary with analysis results
@@ -188,7 +190,8 @@ def analyze_pullup_video(video_path, output_path=None):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps) if output_path else None
     
     rep_data = []
     in_pullup = False
@@ -197,7 +200,9 @@ def analyze_pullup_video(video_path, output_path=None):
     max_chin_height = -1000
     body_swing_positions = []
     
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=1) as pose:
+    canvas = None
+    
+    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=model_complexity) as pose:
         frame_count = 0
         while cap.isOpened():
             ret, frame = cap.read()
@@ -206,11 +211,13 @@ def analyze_pullup_video(video_path, output_path=None):
             
             frame_count += 1
             
-            # Process frame
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
+            # Output canvas, reused every frame: the frame is converted straight into
+            # its top rows and the info panel is drawn into the bottom rows
+            frame_h, frame_w = frame.shape[:2]
+            if canvas is None:
+                canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=canvas[:frame_h])
             results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
             
             current_angle_val = 0
             chin_over_bar = False
@@ -277,18 +284,17 @@ def analyze_pullup_video(video_path, output_path=None):
                 image_rgb = add_metric_overlays(image_rgb, metrics)
             
             # Add info panel
-            final_image = add_info_panel(image_rgb, frame_count, total_frames, fps, rep_count, 
+            final_image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, 
                                         min_elbow_angle, chin_over_bar)
-            output_frames.append(final_image)
+            if writer is not None:
+                writer.write(final_image)
 
     cap.release()
     
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             print(f"Error writing video: {e}")
             return {"error": str(e)}
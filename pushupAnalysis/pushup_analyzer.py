@@ -10,42 +10,22 @@ import time
 import os
 from datetime import datetime
 import json
+import sys
+from functools import lru_cache
+
+# Metric and overlay helpers are shared with the web backend's analyzer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from core.landmarks import landmarks_array, draw_skeleton
+from core.pushup_analyzer import get_key_metrics, add_metric_overlays, get_form_rating
 
 # Initialize MediaPipe
 mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
 
-# NSCA Push-Up Standards
-NSCA_STANDARDS = {
-    "elbow_angle": {"optimal": 90, "range": (80, 100)},
-    "torso_straightness": {"optimal": 0, "range": (-5, 5)},
-    "shoulder_angle": {"optimal": 45, "range": (40, 50)}
-}
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
 
-def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-    
-    ba = a - b
-    bc = c - b
-    
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    
-    return int(np.degrees(np.arccos(cosine_angle)))
-
-def calculate_torso_angle(shoulder, hip, ankle):
-    """Calculate torso angle relative to horizontal line"""
-    shoulder = np.array(shoulder)
-    hip = np.array(hip)
-    ankle = np.array(ankle)
-    
-    # Create horizontal reference line at hip level
-    horizontal_point = (hip[0] + 100, hip[1])
-    
-    return calculate_angle(horizontal_point, hip, shoulder)
+# Every landmark gets a marker, as mp_drawing.draw_landmarks did
+ALL_JOINTS = range(33)
 
 def analyze_pushup_video(video_path):
     """
@@ -88,6 +68,7 @@ def analyze_pushup_video(video_path):
     rep_count = 0
     min_elbow_angle = 180
     max_hip_drop = 0
+    canvas = None
     
     # Setup MediaPipe
     with mp_pose.Pose(
@@ -107,29 +88,26 @@ def analyze_pushup_video(video_path):
                 
                 frame_count += 1
                 
-                # Process frame
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-                results = pose.process(image)
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                # Process frame: the pose model gets an RGB copy, while drawing and
+                # the preview use the decoded BGR frame directly
+                results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                
+                # Output canvas, reused every frame: the frame is copied into its top rows
+                # and the info panel is drawn into the bottom rows
+                frame_h, frame_w = frame.shape[:2]
+                if canvas is None:
+                    canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                image = canvas[:frame_h]
+                image[:] = frame
                 
                 if results.pose_landmarks:
-                    # Draw skeleton
-                    mp_drawing.draw_landmarks(
-                        image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                        landmark_drawing_spec=mp_drawing.DrawingSpec(
-                            color=(0, 255, 0), thickness=2, circle_radius=2
-                        ),
-                        connection_drawing_spec=mp_drawing.DrawingSpec(
-                            color=(255, 255, 255), thickness=2
-                        )
-                    )
-                    
                     # Get landmarks
-                    landmarks = results.pose_landmarks.landmark
+                    landmarks = landmarks_array(results.pose_landmarks.landmark)
                     h, w = image.shape[:2]
                     
+                    # Draw skeleton
+                    draw_skeleton(image, landmarks, ALL_JOINTS)
+                    
                     # Calculate key angles and metrics
                     metrics = get_key_metrics(landmarks, w, h)
                     
@@ -168,7 +146,7 @@ def analyze_pushup_video(video_path):
                     image = add_metric_overlays(image, metrics)
                 
                 # Add info panel
-                image = add_info_panel(image, frame_count, total_frames, fps, rep_count, 
+                image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, 
                                       min_elbow_angle, max_hip_drop)
                 
                 # Show live preview
@@ -199,165 +177,47 @@ def analyze_pushup_video(video_path):
     
     generate_feedback(rep_data, all_angles, video_path)
 
-def get_key_metrics(landmarks, width, height):
-    """Extract key metrics for push-up analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
-    metrics = {}
-    
-    try:
-        # Left elbow
-        l_shoulder = pixel_coord(11)
-        l_elbow = pixel_coord(13)
-        l_wrist = pixel_coord(15)
-        metrics['left_elbow'] = calculate_angle(l_shoulder, l_elbow, l_wrist)
-        
-        # Right elbow
-        r_shoulder = pixel_coord(12)
-        r_elbow = pixel_coord(14)
-        r_wrist = pixel_coord(16)
-        metrics['right_elbow'] = calculate_angle(r_shoulder, r_elbow, r_wrist)
-        
-        # Shoulder angle (relative to torso)
-        shoulder_mid = (
-            (l_shoulder[0] + r_shoulder[0]) // 2,
-            (l_shoulder[1] + r_shoulder[1]) // 2
-        )
-        hip_mid = (
-            (pixel_coord(23)[0] + pixel_coord(24)[0]) // 2,
-            (pixel_coord(23)[1] + pixel_coord(24)[1]) // 2
-        )
-        
-        # Calculate angle between upper arm and torso
-        metrics['shoulder_angle'] = calculate_angle(l_elbow, l_shoulder, hip_mid)
-        
-        # Torso straightness (hip drop)
-        l_ankle = pixel_coord(27)
-        r_ankle = pixel_coord(28)
-        ankle_mid = (
-            (l_ankle[0] + r_ankle[0]) // 2,
-            (l_ankle[1] + r_ankle[1]) // 2
-        )
-        
-        # Create line from shoulder to ankle
-        shoulder_ankle_line = np.array(ankle_mid) - np.array(shoulder_mid)
-        
-        # Calculate distance from hip to line (hip drop)
-        hip_point = np.array(hip_mid)
-        shoulder_point = np.array(shoulder_mid)
-        
-        # Vector math for point-line distance
-        line_vec = np.array(ankle_mid) - shoulder_point
-        point_vec = hip_point - shoulder_point
-        cross = np.cross(line_vec, point_vec)
-        distance = np.linalg.norm(cross) / np.linalg.norm(line_vec)
-        
-        metrics['hip_drop'] = int(distance)
-        
-        # Body alignment angle
-        metrics['torso_angle'] = calculate_torso_angle(shoulder_mid, hip_mid, ankle_mid)
-        
-    except Exception as e:
-        print(f"Error in metrics: {e}")
-        metrics = {k: None for k in ['left_elbow', 'right_elbow', 'shoulder_angle', 
-                                    'hip_drop', 'torso_angle']}
-    
-    return metrics
-
-def add_metric_overlays(image, metrics):
-    """Add metric displays to frame"""
-    h, w = image.shape[:2]
-    
-    # Display angles at top
-    y_pos = 40
-    
-    if metrics['left_elbow'] is not None:
-        # Color code based on NSCA standard
-        if 80 <= metrics['left_elbow'] <= 100:
-            color = (0, 255, 0)  # Green - good
-        elif 100 < metrics['left_elbow'] <= 120:
-            color = (0, 165, 255)  # Orange - shallow
-        else:
-            color = (0, 0, 255)  # Red - poor
-        
-        cv2.putText(image, f"Elbow: {metrics['left_elbow']}° (NSCA: 90°)", 
-                   (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-    
-    if metrics['shoulder_angle'] is not None:
-        shoulder_color = (0, 255, 0) if 40 <= metrics['shoulder_angle'] <= 50 else (0, 165, 255)
-        cv2.putText(image, f"Shoulder: {metrics['shoulder_angle']}° (Opt: 45°)", 
-                   (20, y_pos + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, shoulder_color, 2)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, current_elbow_angle):
+    """Render the info panel strip; cached since reps/elbow rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
+    panel[:, :] = (40, 40, 40)
     
-    if metrics['hip_drop'] is not None:
-        hip_color = (0, 255, 0) if metrics['hip_drop'] < 20 else (0, 165, 255)
-        cv2.putText(image, f"Hip Drop: {metrics['hip_drop']}px", 
-                   (20, y_pos + 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, hip_color, 2)
+    # Middle: Rep info
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    cv2.putText(panel, f"Elbow: {current_elbow_angle}°", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
-    return image
+    # Right side: NSCA standard
+    cv2.putText(panel, "NSCA Standard:", 
+               (w - 250, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, "• Elbows at 90°", 
+               (w - 250, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Straight body line", 
+               (w - 250, PANEL_HEIGHT - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Shoulders 45° to torso", 
+               (w - 250, PANEL_HEIGHT - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    
+    return panel
 
 def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle, hip_drop):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
     
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
-    panel[:, :] = (40, 40, 40)
-    
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Reuse the cached strip; only the frame counter and time change every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, current_elbow_angle)
     
     # Add info
     time_sec = frame / fps if fps > 0 else 0
     
     # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    cv2.putText(image_with_panel, f"Time: {time_sec:.1f}s", 
+    cv2.putText(image, f"Time: {time_sec:.1f}s", 
                (20, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Elbow: {current_elbow_angle}°", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
-    
-    # Right side: NSCA standard
-    cv2.putText(image_with_panel, "NSCA Standard:", 
-               (w - 250, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, "• Elbows at 90°", 
-               (w - 250, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Straight body line", 
-               (w - 250, new_h - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Shoulders 45° to torso", 
-               (w - 250, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    
-    return image_with_panel
-
-def get_form_rating(elbow_angle, hip_drop):
-    """Rate push-up form"""
-    # Check depth
-    if elbow_angle > 120:
-        depth = "Very Shallow"
-    elif elbow_angle > 100:
-        depth = "Shallow"
-    elif elbow_angle > 80:
-        depth = "Good Depth"
-    else:
-        depth = "Excellent Depth"
-    
-    # Check body alignment
-    if hip_drop > 40:
-        alignment = " - Significant Sag"
-    elif hip_drop > 20:
-        alignment = " - Mild Sag"
-    else:
-        alignment = " - Good Alignment"
-    
-    return depth + alignment
+    return image
 
 def generate_feedback(rep_data, all_angles, video_path):
     """Generate comprehensive feedback based on analysis"""
@@ -4,14 +4,20 @@ Analyzes bench press form using MediaPipe pose detection
 """
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
+from functools import lru_cache
+from .pose_landmarker import create_pose
+from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+from .video_reader import open_capture, read_frames, pose_frames, pose_stride
+from .video_writer import VideoWriter
 
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
+# Joints that get a marker on the skeleton overlay
+KEY_JOINTS = (11, 12, 13, 14, 15, 16, 23, 24)
 
 # NSCA Bench Press Standards
 NSCA_STANDARDS = {
@@ -39,27 +45,19 @@ def calculate_angle(a, b, c):
 
 def get_key_metrics(landmarks, width, height):
     """Extract key metrics for bench press analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
     metrics = {}
     
     try:
+        # One array lookup for every joint; plain ints keep the metrics JSON-serializable
+        l_shoulder, l_elbow, l_wrist, r_shoulder, r_elbow, r_wrist, l_hip, r_hip = landmarks_to_pixels(
+            landmarks, width, height, (11, 13, 15, 12, 14, 16, 23, 24)
+        ).tolist()
+        
         # Elbow angles (shoulder-elbow-wrist)
-        l_shoulder = pixel_coord(11)
-        l_elbow = pixel_coord(13)
-        l_wrist = pixel_coord(15)
         metrics['left_elbow'] = calculate_angle(l_shoulder, l_elbow, l_wrist)
-        
-        r_shoulder = pixel_coord(12)
-        r_elbow = pixel_coord(14)
-        r_wrist = pixel_coord(16)
         metrics['right_elbow'] = calculate_angle(r_shoulder, r_elbow, r_wrist)
         
         # Elbow flare (angle from torso)
-        l_hip = pixel_coord(23)
-        r_hip = pixel_coord(24)
         hip_mid = (
             (l_hip[0] + r_hip[0]) // 2,
             (l_hip[1] + r_hip[1]) // 2
@@ -81,7 +79,7 @@ def get_key_metrics(landmarks, width, height):
         metrics['right_shoulder_angle'] = calculate_angle(r_elbow, r_shoulder, r_hip)
         
     except Exception as e:
-        print(f"Error in metrics: {e}")
+        # Called on every frame; the None metrics already mark the frame as unusable
         metrics = {k: None for k in ['left_elbow', 'right_elbow', 'left_elbow_flare', 
                                     'right_elbow_flare', 'bar_height', 'wrist_x',
                                     'left_shoulder_angle', 'right_shoulder_angle']}
@@ -126,43 +124,42 @@ def add_metric_overlays(image, metrics):
     
     return image
 
-def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, current_elbow_angle):
+    """Render the info panel strip; cached since reps/elbow rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
     panel[:, :] = (40, 40, 40)
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Middle: Rep info
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    cv2.putText(panel, f"Elbow: {current_elbow_angle}", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
-    # Add info
-    time_sec = frame / fps if fps > 0 else 0
+    # Right side: NSCA standard
+    cv2.putText(panel, "NSCA Standard:", 
+               (w - 280, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, "• Bar to chest", 
+               (w - 280, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Full extension", 
+               (w - 280, PANEL_HEIGHT - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Controlled tempo", 
+               (w - 280, PANEL_HEIGHT - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
     
-    # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
-               (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    return panel
+
+def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle):
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
     
-    # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Elbow: {current_elbow_angle}", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
+    # Reuse the cached strip; only the frame counter changes every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, current_elbow_angle)
     
-    # Right side: NSCA standard
-    cv2.putText(image_with_panel, "NSCA Standard:", 
-               (w - 280, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, "• Bar to chest", 
-               (w - 280, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Full extension", 
-               (w - 280, new_h - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Controlled tempo", 
-               (w - 280, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    # Left side: Basic info
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
+               (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    return image_with_panel
+    return image
 
 def analyze_bench_press_video(video_path, output_path=None):
     """
@@ -172,7 +169,7 @@ def analyze_bench_press_video(video_path, output_path=None):
     if not os.path.exists(video_path):
         return {"error": "Video not found"}
     
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened():
         return {"error": "Cannot open video"}
     
@@ -181,7 +178,8 @@ def analyze_bench_press_video(video_path, output_path=None):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps) if output_path else None
     
     rep_data = []
     in_press = False
@@ -190,32 +188,42 @@ def analyze_bench_press_video(video_path, output_path=None):
     max_elbow_flare = 0
     bar_path_positions = []
     
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=1) as pose:
+    # Running totals for the per-rep averages, updated as each rep completes
+    sum_min_elbow_angle = 0
+    sum_max_elbow_flare = 0
+    
+    canvas = None
+    
+    # Run pose inference on every stride-th frame only
+    stride = pose_stride(fps)
+    last_results = None
+
+    with create_pose(fps, stride, model_complexity=1, min_detection_confidence=0.7, min_tracking_confidence=0.7) as pose:
         frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # Decoding and inference each run on their own thread ahead of the drawing below
+        for frame_rgb, results in pose_frames(read_frames(cap), pose, stride):
             
             frame_count += 1
             
-            # Process frame
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
-            results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
+            # Frames between strides share the last inference; the rep state
+            # machine has already seen those landmarks, so only the overlay is redrawn
+            inferred = results is not last_results
+            last_results = results
+            
+            # Output canvas, reused every frame: the frame is copied into its top rows
+            # and the info panel is drawn into the bottom rows
+            frame_h, frame_w = frame_rgb.shape[:2]
+            if canvas is None:
+                canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+            image_rgb = canvas[:frame_h]
+            image_rgb[:] = frame_rgb
             
             current_angle_val = 0
 
             # Draw skeleton for output video
             if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    image_rgb, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2)
-                )
-                
-                landmarks = results.pose_landmarks.landmark
+                landmarks = landmarks_array(results.pose_landmarks.landmark)
+                draw_skeleton(image_rgb, landmarks, KEY_JOINTS)
                 
                 # Calculate key metrics
                 metrics = get_key_metrics(landmarks, width, height)
@@ -249,8 +257,8 @@ def analyze_bench_press_video(video_path, output_path=None):
                 
                 # Get visibility from landmarks directly to be robust
                 try:
-                    l_vis = (landmarks[11].visibility + landmarks[13].visibility + landmarks[15].visibility) / 3
-                    r_vis = (landmarks[12].visibility + landmarks[14].visibility + landmarks[16].visibility) / 3
+                    l_vis = landmarks[(11, 13, 15), 2].sum() / 3
+                    r_vis = landmarks[(12, 14, 16), 2].sum() / 3
                     if r_vis > l_vis:
                         track_side = "right"
                         current_angle = metrics['right_elbow']
@@ -258,7 +266,7 @@ def analyze_bench_press_video(video_path, output_path=None):
                 except:
                     pass
 
-                if current_angle is not None:
+                if inferred and current_angle is not None:
                     current_angle_val = current_angle
                     
                     # Track bar path
@@ -296,6 +304,9 @@ def analyze_bench_press_video(video_path, output_path=None):
                             bar_path_deviation = max(bar_path_positions) - min(bar_path_positions)
                         bar_path_positions = []
                         
+                        sum_min_elbow_angle += min_elbow_angle
+                        sum_max_elbow_flare += max_elbow_flare
+                        
                         rep_data.append({
                             "rep": rep_count,
                             "min_elbow_angle": min_elbow_angle,
@@ -308,33 +319,22 @@ def analyze_bench_press_video(video_path, output_path=None):
                 image_rgb = add_metric_overlays(image_rgb, metrics)
             
             # Add info panel
-            final_image = add_info_panel(image_rgb, frame_count, total_frames, fps, rep_count, 
+            final_image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, 
                                         min_elbow_angle)
             
             # Ensure final frame is uint8
             if final_image.dtype != np.uint8:
                 final_image = final_image.astype(np.uint8)
                 
-            output_frames.append(final_image)
+            if writer is not None:
+                writer.write(final_image)
 
     cap.release()
     
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            # Fix for Real Time Coach video speed
-            # If it's a recorded video, calculate FPS based on known 10s duration
-            if "recorded_video" in os.path.basename(video_path) and len(output_frames) > 0:
-                fps = len(output_frames) / 10.0
-                print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
-            
-            # Ensure FPS is valid
-            if fps <= 0 or fps > 120:
-                fps = 30.0
-            
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             print(f"Error writing video: {e}")
             pass
@@ -345,8 +345,8 @@ def analyze_bench_press_video(video_path, output_path=None):
     corrections = []
     
     if rep_data:
-        avg_elbow_angle = np.mean([r["min_elbow_angle"] for r in rep_data])
-        avg_elbow_flare = np.mean([r["max_elbow_flare"] for r in rep_data])
+        avg_elbow_angle = sum_min_elbow_angle / len(rep_data)
+        avg_elbow_flare = sum_max_elbow_flare / len(rep_data)
         
         # Depth feedback
         if avg_elbow_angle > 100:
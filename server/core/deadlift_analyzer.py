@@ -1,13 +1,19 @@
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
+from functools import lru_cache
 from datetime import datetime
+from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+from .pose_landmarker import create_pose
+from .video_reader import open_capture, read_frames, pose_frames, pose_stride
+from .video_writer import VideoWriter
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
+# Joints that get a marker on the skeleton overlay
+KEY_JOINTS = (11, 12, 23, 24, 25, 26, 27, 28)
 
 # NSCA Deadlift Standards
 NSCA_STANDARDS = {
@@ -15,79 +21,58 @@ NSCA_STANDARDS = {
     "hip_height_start": {"optimal": "above_knees"},
 }
 
-def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c with error handling"""
-    try:
-        a = np.array(a)
-        b = np.array(b)
-        c = np.array(c)
-        
-        ba = a - b
-        bc = c - b
-        
-        cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-        cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-        
-        return int(np.degrees(np.arccos(cosine_angle)))
-    except:
-        return None
-
-def safe_min(values):
-    """Safely find minimum, ignoring None values"""
-    valid_values = [v for v in values if v is not None]
-    return min(valid_values) if valid_values else 180
-
-def safe_max(values):
-    """Safely find maximum, ignoring None values"""
-    valid_values = [v for v in values if v is not None]
-    return max(valid_values) if valid_values else 0
-
-def safe_mean(values):
-    """Safely calculate mean, ignoring None values"""
-    valid_values = [v for v in values if v is not None]
-    return np.mean(valid_values) if valid_values else 0
+def calculate_angles(a, b, c):
+    """Calculate the angle at b formed by a-b-c for each matching row of a, b, c (None where undefined)"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    c = np.asarray(c, dtype=float)
+    
+    ba = a - b
+    bc = c - b
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
+    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+    
+    degrees = np.degrees(np.arccos(cosine_angle))
+    return [int(d) if np.isfinite(d) else None for d in degrees]
 
 def get_deadlift_angles(landmarks, width, height):
     """Extract key angles for deadlift analysis with error handling"""
     angles = {}
     
     try:
-        def pixel_coord(idx):
-            lm = landmarks[idx]
-            return (int(lm.x * width), int(lm.y * height))
-        
-        # Get key points
-        l_shoulder = pixel_coord(11)
-        r_shoulder = pixel_coord(12)
-        l_hip = pixel_coord(23)
-        r_hip = pixel_coord(24)
-        l_knee = pixel_coord(25)
-        r_knee = pixel_coord(26)
-        l_ankle = pixel_coord(27)
-        r_ankle = pixel_coord(28)
+        # Get key points (one pass over the landmark protos)
+        l_shoulder, r_shoulder, l_hip, r_hip, l_knee, l_ankle = landmarks_to_pixels(
+            landmarks, width, height, (11, 12, 23, 24, 25, 27)
+        )
         
         # Mid points
-        shoulder_mid = (
-            (l_shoulder[0] + r_shoulder[0]) // 2,
-            (l_shoulder[1] + r_shoulder[1]) // 2
-        )
-        hip_mid = (
-            (l_hip[0] + r_hip[0]) // 2,
-            (l_hip[1] + r_hip[1]) // 2
-        )
+        shoulder_mid = (l_shoulder + r_shoulder) // 2
+        hip_mid = (l_hip + r_hip) // 2
         
-        # Back angle (vertical line through hips vs shoulder-hip line)
-        vertical_point = (hip_mid[0], hip_mid[1] - 100)
-        back_angle = calculate_angle(vertical_point, hip_mid, shoulder_mid)
+        # Back angle (vertical line through hips vs shoulder-hip line),
+        # left knee and hip angle are computed together in one vectorized call
+        # Note: Using left knee for hip angle calculation, assuming side view
+        vertical_point = hip_mid - (0, 100)
+        back_angle, left_knee, hip_angle = calculate_angles(
+            [vertical_point, l_hip, shoulder_mid],
+            [hip_mid, l_knee, hip_mid],
+            [shoulder_mid, l_ankle, l_knee]
+        )
         angles['back_angle'] = back_angle if back_angle else None
         
         # Knee angles
-        angles['left_knee'] = calculate_angle(l_hip, l_knee, l_ankle)
-        angles['right_knee'] = calculate_angle(r_hip, r_knee, r_ankle)
+        # The right side is only a fallback for callers (left_knee or right_knee),
+        # so skip its landmarks entirely when the left knee angle is usable
+        angles['left_knee'] = left_knee
+        if angles['left_knee']:
+            angles['right_knee'] = None
+        else:
+            r_knee, r_ankle = landmarks_to_pixels(landmarks, width, height, (26, 28))
+            angles['right_knee'] = calculate_angles([r_hip], [r_knee], [r_ankle])[0]
         
-        # Hip angle
-        # Note: Using left knee for hip angle calculation, assuming side view
-        angles['hip_angle'] = calculate_angle(shoulder_mid, hip_mid, l_knee)
+        angles['hip_angle'] = hip_angle
         
     except Exception as e:
         # Set all to None if any calculation fails
@@ -118,11 +103,13 @@ def analyze_single_deadlift_rep_safe(rep_data, rep_number):
     """Safe analysis of a single deadlift rep"""
     warnings = []
     
-    # Get valid angles only
-    valid_back_angles = [a for a in rep_data["back_angles"] if a is not None]
-    valid_knee_angles = [a for a in rep_data["knee_angles"] if a is not None]
+    # Missing angles become NaN, which the nan* reductions skip
+    back_angles = np.array(rep_data["back_angles"], dtype=float)
+    knee_angles = np.array(rep_data["knee_angles"], dtype=float)
+    valid_back = ~np.isnan(back_angles)
+    valid_knee = ~np.isnan(knee_angles)
     
-    if not valid_back_angles or not valid_knee_angles:
+    if not valid_back.any() or not valid_knee.any():
         warnings.append(f"Rep {rep_number}: Insufficient data for analysis")
         return {
             "rep": rep_number,
@@ -135,10 +122,10 @@ def analyze_single_deadlift_rep_safe(rep_data, rep_number):
         }
     
     # Calculate metrics
-    start_back_angle = valid_back_angles[0] if valid_back_angles else None
-    min_knee_angle = safe_min(valid_knee_angles)
-    max_back_angle = safe_max(valid_back_angles)
-    avg_back_angle = safe_mean(valid_back_angles)
+    start_back_angle = int(back_angles[valid_back][0])
+    min_knee_angle = int(np.nanmin(knee_angles))
+    max_back_angle = int(np.nanmax(back_angles))
+    avg_back_angle = np.nanmean(back_angles)
     
     # Check for form issues
     if start_back_angle:
@@ -148,10 +135,9 @@ def analyze_single_deadlift_rep_safe(rep_data, rep_number):
             warnings.append(f"Back too vertical at start ({start_back_angle}°)")
     
     # Check lockout
-    if valid_knee_angles:
-        final_knee_angle = valid_knee_angles[-1]
-        if final_knee_angle < 170:
-            warnings.append(f"Incomplete lockout ({final_knee_angle}°)")
+    final_knee_angle = int(knee_angles[valid_knee][-1])
+    if final_knee_angle < 170:
+        warnings.append(f"Incomplete lockout ({final_knee_angle}°)")
     
     return {
         "rep": rep_number,
@@ -163,6 +149,19 @@ def analyze_single_deadlift_rep_safe(rep_data, rep_number):
         "frames": len(rep_data["frames"])
     }
 
+# Overlay colour for each lift phase
+PHASE_COLORS = {
+    "setup": (255, 255, 0),
+    "pull": (0, 255, 255),
+    "lockout": (0, 255, 0),
+    "lower": (255, 165, 0)
+}
+
+@lru_cache(maxsize=None)
+def phase_label(phase):
+    """Phase caption, formatted once per phase"""
+    return f"Phase: {phase.upper()}"
+
 def add_deadlift_overlays_safe(image, angles, phase, rep_count, width, height):
     """Safe version of overlays"""
     h, w = image.shape[:2]
@@ -198,69 +197,63 @@ def add_deadlift_overlays_safe(image, angles, phase, rep_count, width, height):
                    (20, y_pos + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (100, 100, 100), 2)
     
     # Phase and reps
-    phase_color = {
-        "setup": (255, 255, 0),
-        "pull": (0, 255, 255),
-        "lockout": (0, 255, 0),
-        "lower": (255, 165, 0)
-    }.get(phase, (255, 255, 255))
-    
-    cv2.putText(image, f"Phase: {phase.upper()}", 
+    phase_color = PHASE_COLORS.get(phase, (255, 255, 255))
+    
+    cv2.putText(image, phase_label(phase), 
                (w - 150, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.7, phase_color, 2)
     cv2.putText(image, f"Reps: {rep_count}", 
                (w - 150, y_pos + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     
     return image
 
-def add_deadlift_info_panel_safe(image, frame, total_frames, fps, reps, phase, warnings, width, height):
-    """Safe info panel"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
+@lru_cache(maxsize=256)
+def render_deadlift_info_panel(w, reps, phase, last_warning):
+    """Render the info panel strip; cached since phase/reps/warning rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
     panel[:, :] = (40, 40, 40)
     
-    # Add panel
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
-    
-    # Basic info
-    time_sec = frame / fps if fps > 0 else 0
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
-               (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    
     # Phase and reps
-    phase_color = {
-        "setup": (255, 255, 0),
-        "pull": (0, 255, 255),
-        "lockout": (0, 255, 0),
-        "lower": (255, 165, 0)
-    }.get(phase, (255, 255, 255))
-    
-    cv2.putText(image_with_panel, f"Phase: {phase.upper()}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, phase_color, 2)
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    phase_color = PHASE_COLORS.get(phase, (255, 255, 255))
+    
+    cv2.putText(panel, phase_label(phase), 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, phase_color, 2)
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     
     # Last warning
+    if last_warning is not None:
+        cv2.putText(panel, f"Last: {last_warning}", 
+                   (20, PANEL_HEIGHT - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    
+    return panel
+
+def add_deadlift_info_panel_safe(image, frame, total_frames, fps, reps, phase, warnings, width, height):
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
+    
+    last_warning = None
     if warnings:
         last_warning = warnings[-1] if isinstance(warnings[-1], str) else str(warnings[-1])
         if len(last_warning) > 40:
             last_warning = last_warning[:37] + "..."
-        cv2.putText(image_with_panel, f"Last: {last_warning}", 
-                   (20, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
     
-    return image_with_panel
+    # Reuse the cached strip; only the frame counter changes every frame
+    image[new_h - PANEL_HEIGHT:] = render_deadlift_info_panel(w, reps, phase, last_warning)
+    
+    # Basic info
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
+               (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    
+    return image
 
-def analyze_deadlift_video(video_path, output_path=None):
+def analyze_deadlift_video(video_path, output_path=None, model_complexity=0):
     """
     Main deadlift analysis function adapted for web backend
     """
     if not os.path.exists(video_path):
         return {"error": "Video not found"}
     
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened():
         return {"error": "Cannot open video"}
     
@@ -269,15 +262,14 @@ def analyze_deadlift_video(video_path, output_path=None):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps) if output_path else None
     
     rep_data = []
     current_rep = {
         "frames": [],
         "back_angles": [],
-        "hip_angles": [],
         "knee_angles": [],
-        "shoulder_positions": [],
         "start_frame": 0
     }
     
@@ -286,48 +278,48 @@ def analyze_deadlift_video(video_path, output_path=None):
     rep_count = 0
     warning_flags = []
     
-    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5, model_complexity=1) as pose:
+    canvas = None
+    
+    # Run pose inference on every stride-th frame only
+    stride = pose_stride(fps)
+
+    with create_pose(fps, stride, model_complexity, min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
         frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # Decoding and inference each run on their own thread ahead of the drawing below
+        for frame_rgb, results in pose_frames(read_frames(cap), pose, stride):
             
             frame_count += 1
             
-            # Process frame
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
-            results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
+            # Output canvas, reused every frame: the frame is copied into its top rows
+            # and the info panel is drawn into the bottom rows.
+            # Nothing is drawn when there is no output video to write.
+            if writer is not None:
+                frame_h, frame_w = frame_rgb.shape[:2]
+                if canvas is None:
+                    canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                image_rgb = canvas[:frame_h]
+                image_rgb[:] = frame_rgb
             
             if results.pose_landmarks:
-                # Draw skeleton
-                mp_drawing.draw_landmarks(
-                    image_rgb, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2)
-                )
+                landmarks = landmarks_array(results.pose_landmarks.landmark)
                 
-                # Highlight spine (simplified drawing)
-                try:
-                    left_shoulder = results.pose_landmarks.landmark[11]
-                    right_shoulder = results.pose_landmarks.landmark[12]
-                    left_hip = results.pose_landmarks.landmark[23]
-                    right_hip = results.pose_landmarks.landmark[24]
-                    
-                    shoulder_mid_x = int((left_shoulder.x + right_shoulder.x) * width / 2)
-                    shoulder_mid_y = int((left_shoulder.y + right_shoulder.y) * height / 2)
-                    hip_mid_x = int((left_hip.x + right_hip.x) * width / 2)
-                    hip_mid_y = int((left_hip.y + right_hip.y) * height / 2)
+                if writer is not None:
+                    # Draw skeleton
+                    draw_skeleton(image_rgb, landmarks, KEY_JOINTS)
                     
-                    cv2.line(image_rgb, (shoulder_mid_x, shoulder_mid_y), 
-                            (hip_mid_x, hip_mid_y), (0, 0, 255), 3)
-                except:
-                    pass
+                    # Highlight spine (simplified drawing)
+                    try:
+                        shoulder_mid_x = int((landmarks[11, 0] + landmarks[12, 0]) * width / 2)
+                        shoulder_mid_y = int((landmarks[11, 1] + landmarks[12, 1]) * height / 2)
+                        hip_mid_x = int((landmarks[23, 0] + landmarks[24, 0]) * width / 2)
+                        hip_mid_y = int((landmarks[23, 1] + landmarks[24, 1]) * height / 2)
+                        
+                        cv2.line(image_rgb, (shoulder_mid_x, shoulder_mid_y), 
+                                (hip_mid_x, hip_mid_y), (0, 0, 255), 3)
+                    except:
+                        pass
                 
-                # Get landmarks and calculate angles
-                landmarks = results.pose_landmarks.landmark
+                # Calculate angles
                 angles = get_deadlift_angles(landmarks, width, height)
                 
                 current_knee_angle = angles.get('left_knee') or angles.get('right_knee')
@@ -342,9 +334,7 @@ def analyze_deadlift_video(video_path, output_path=None):
                         current_rep = {
                             "frames": [],
                             "back_angles": [],
-                            "hip_angles": [],
                             "knee_angles": [],
-                            "shoulder_positions": [],
                             "start_frame": frame_count
                         }
 
@@ -371,26 +361,21 @@ def analyze_deadlift_video(video_path, output_path=None):
                                 warning_flags.extend(rep_analysis["warnings"])
                     
                 # Add overlays
-                image_rgb = add_deadlift_overlays_safe(image_rgb, angles, lift_phase, rep_count, width, height)
+                if writer is not None:
+                    image_rgb = add_deadlift_overlays_safe(image_rgb, angles, lift_phase, rep_count, width, height)
             
             # Add info panel
-            final_image = add_deadlift_info_panel_safe(image_rgb, frame_count, total_frames, fps, 
-                                                     rep_count, lift_phase, warning_flags, width, height)
-            output_frames.append(final_image)
+            if writer is not None:
+                final_image = add_deadlift_info_panel_safe(canvas, frame_count, total_frames, fps, 
+                                                         rep_count, lift_phase, warning_flags, width, height)
+                writer.write(final_image)
 
     cap.release()
 
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            # Fix for Real Time Coach video speed
-            if "recorded_video" in os.path.basename(video_path) and len(output_frames) > 0:
-                fps = len(output_frames) / 10.0
-                print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
-
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             return {"error": str(e)}
 
@@ -399,11 +384,8 @@ def analyze_deadlift_video(video_path, output_path=None):
     corrections = []
     
     # Collect warnings into feedback/corrections
-    all_warnings = []
-    for rep in rep_data:
-        all_warnings.extend(rep.get("warnings", []))
-    
-    unique_warnings = sorted(list(set(all_warnings)))
+    # (warning_flags already holds every rep's warnings, in rep order)
+    unique_warnings = sorted(set(warning_flags))
     
     if unique_warnings:
         feedback.append("Form Issues Detected")
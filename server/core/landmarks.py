@@ -0,0 +1,47 @@
+"""
+Landmark extraction shared by the analyzers
+"""
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+# Skeleton edges as an (N, 2) index array, built once
+POSE_CONNECTIONS = np.array(sorted(mp.solutions.pose.POSE_CONNECTIONS), dtype=np.int32)
+
+def landmarks_array(landmarks):
+    """
+    (33, 3) array of normalized x, y and visibility.
+    Built once per frame so the helpers below index an array instead of
+    reading the landmark protos one attribute at a time.
+    """
+    return np.array([(lm.x, lm.y, lm.visibility) for lm in landmarks])
+
+def landmarks_to_pixels(landmarks, width, height, indices):
+    """
+    Pixel (x, y) of the given landmark indices as an int array, from a
+    landmarks_array(). Truncates like int(lm.x * width) did.
+    """
+    return (landmarks[list(indices), :2] * (width, height)).astype(int)
+
+def draw_skeleton(image, landmarks, joints, line_color=(255, 255, 255), joint_color=(0, 255, 0),
+                  thickness=2, circle_radius=2):
+    """
+    Draw every pose connection of a landmarks_array() with one cv2.polylines
+    call and circles on the given joints only. Like mp_drawing.draw_landmarks, landmarks that are
+    barely visible or outside the frame are skipped.
+    """
+    h, w = image.shape[:2]
+    xy = landmarks[:, :2]
+    visible = (landmarks[:, 2] >= 0.5) & (xy >= 0).all(axis=1) & (xy <= 1).all(axis=1)
+    pts = np.minimum(np.floor(xy * (w, h)), (w - 1, h - 1)).astype(np.int32)
+    
+    segments = POSE_CONNECTIONS[visible[POSE_CONNECTIONS].all(axis=1)]
+    if len(segments):
+        cv2.polylines(image, pts[segments], False, line_color, thickness)
+    
+    for idx in joints:
+        if visible[idx]:
+            cv2.circle(image, (int(pts[idx, 0]), int(pts[idx, 1])), circle_radius, joint_color, thickness)
+    
+    return image
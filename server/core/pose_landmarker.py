@@ -0,0 +1,213 @@
+"""
+Pose model selection for the analyzers.
+By default this is the CPU mp.solutions.pose graph, reused across videos.
+Pointing the POSE_LANDMARKER_MODEL environment variable at a
+pose_landmarker_*.task bundle switches to the MediaPipe Tasks PoseLandmarker,
+which can run on the GPU delegate, or on CPU with a quantized (float16/int8) bundle.
+Pointing POSE_MOVENET_MODEL at a MoveNet SinglePose .tflite file instead
+switches to MoveNet (needs tflite-runtime or tensorflow), a lighter CPU model
+whose 17 keypoints cover every joint the analyzers use.
+"""
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+# Path to a pose_landmarker_*.task bundle; unset keeps the solutions API
+POSE_LANDMARKER_MODEL = os.environ.get("POSE_LANDMARKER_MODEL")
+# Path to a MoveNet SinglePose (Lightning or Thunder) .tflite model; takes precedence over the above
+POSE_MOVENET_MODEL = os.environ.get("POSE_MOVENET_MODEL")
+
+# MediaPipe landmark index of each of MoveNet's 17 COCO keypoints, in order
+# (nose, eyes, ears, shoulders, elbows, wrists, hips, knees, ankles)
+MOVENET_TO_MEDIAPIPE = (0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28)
+# Mean MoveNet keypoint score below which no pose is reported; its scores run lower
+# than MediaPipe's confidences, so the analyzers' thresholds don't carry over
+MOVENET_MIN_POSE_SCORE = 0.25
+
+class _Landmark:
+    """Mirrors a NormalizedLandmark"""
+
+    def __init__(self, x=0.0, y=0.0, visibility=0.0):
+        self.x = x
+        self.y = y
+        self.z = 0.0
+        self.visibility = visibility
+
+class _PoseLandmarks:
+    """Mirrors the NormalizedLandmarkList the solutions API returns"""
+
+    def __init__(self, landmark):
+        self.landmark = landmark
+
+class _PoseResults:
+    """Mirrors the result object returned by mp_pose.Pose.process"""
+
+    def __init__(self, pose_landmarks):
+        self.pose_landmarks = pose_landmarks
+
+class TaskPose:
+    """
+    Drop-in for mp_pose.Pose backed by PoseLandmarker in VIDEO mode.
+    Tries the GPU delegate first and falls back to CPU where it is unavailable.
+    """
+
+    def __init__(self, model_path, inference_fps, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        from mediapipe.tasks.python import BaseOptions
+        from mediapipe.tasks.python.vision import PoseLandmarker, PoseLandmarkerOptions, RunningMode
+
+        def create(delegate):
+            options = PoseLandmarkerOptions(
+                base_options=BaseOptions(model_asset_path=model_path, delegate=delegate),
+                running_mode=RunningMode.VIDEO,
+                min_pose_detection_confidence=min_detection_confidence,
+                min_tracking_confidence=min_tracking_confidence
+            )
+            return PoseLandmarker.create_from_options(options)
+
+        try:
+            self.landmarker = create(BaseOptions.Delegate.GPU)
+        except Exception as e:
+            print(f"DEBUG: GPU delegate unavailable ({e}), using CPU")
+            self.landmarker = create(BaseOptions.Delegate.CPU)
+
+        # detect_for_video needs strictly increasing timestamps
+        self.frame_ms = 1000.0 / inference_fps
+        self.calls = 0
+
+    def process(self, image_rgb):
+        """Detect the pose in one RGB frame"""
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
+        timestamp_ms = int(self.calls * self.frame_ms)
+        self.calls += 1
+
+        result = self.landmarker.detect_for_video(image, timestamp_ms)
+        if not result.pose_landmarks:
+            return _PoseResults(None)
+        return _PoseResults(_PoseLandmarks(result.pose_landmarks[0]))
+
+    def skip_frame(self):
+        """Count a frame that reused the last landmarks, so timestamps follow the source clock"""
+        self.calls += 1
+
+    def close(self):
+        self.landmarker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class MoveNetPose:
+    """
+    Drop-in for mp_pose.Pose backed by a MoveNet SinglePose TFLite model.
+    Its keypoints fill the matching MediaPipe landmark slots; the other slots
+    (hands, feet, face details) get zero visibility. MoveNet has no tracking
+    state, so the pose is reported whenever the mean keypoint score reaches
+    MOVENET_MIN_POSE_SCORE.
+    """
+
+    def __init__(self, model_path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.size = int(self.input["shape"][1])
+
+    def process(self, image_rgb):
+        """Detect the pose in one RGB frame"""
+        # Letterbox into the square model input, padding on the right/bottom
+        h, w = image_rgb.shape[:2]
+        scale = self.size / max(h, w)
+        resized_w, resized_h = max(1, round(w * scale)), max(1, round(h * scale))
+        square = np.zeros((1, self.size, self.size, 3), dtype=self.input["dtype"])
+        square[0, :resized_h, :resized_w] = cv2.resize(image_rgb, (resized_w, resized_h),
+                                                       interpolation=cv2.INTER_AREA)
+
+        self.interpreter.set_tensor(self.input["index"], square)
+        self.interpreter.invoke()
+        # (17, 3) rows of y, x, score, normalized to the padded square
+        keypoints = self.interpreter.get_tensor(self.output["index"]).reshape(17, 3)
+
+        if keypoints[:, 2].mean() < MOVENET_MIN_POSE_SCORE:
+            return _PoseResults(None)
+
+        landmark = [_Landmark() for _ in range(33)]
+        for idx, (y, x, score) in zip(MOVENET_TO_MEDIAPIPE, keypoints.tolist()):
+            landmark[idx] = _Landmark(x * self.size / resized_w, y * self.size / resized_h, score)
+        return _PoseResults(_PoseLandmarks(landmark))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Idle solutions-API Pose graphs by settings, reused by later videos in this process
+_idle_poses = {}
+_idle_lock = threading.Lock()
+
+@atexit.register
+def _close_idle_poses():
+    with _idle_lock:
+        for pose in _idle_poses.values():
+            pose.close()
+        _idle_poses.clear()
+
+@contextmanager
+def create_pose(fps, stride=1, model_complexity=0, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    """
+    Pose estimator for a video at the given FPS, where process() is called on
+    every stride-th frame.
+    Solutions-API graphs are kept after the video and reset, so the next video
+    with the same settings skips building the graph and loading the model.
+    """
+    if POSE_MOVENET_MODEL:
+        with MoveNetPose(POSE_MOVENET_MODEL) as pose:
+            yield pose
+        return
+
+    if POSE_LANDMARKER_MODEL:
+        inference_fps = (fps if 0 < fps <= 120 else 30.0) / stride
+        with TaskPose(POSE_LANDMARKER_MODEL, inference_fps,
+                      min_detection_confidence=min_detection_confidence,
+                      min_tracking_confidence=min_tracking_confidence) as pose:
+            yield pose
+        return
+
+    key = (model_complexity, min_detection_confidence, min_tracking_confidence)
+    with _idle_lock:
+        pose = _idle_poses.pop(key, None)
+    if pose is None:
+        pose = mp.solutions.pose.Pose(min_detection_confidence=min_detection_confidence,
+                                      min_tracking_confidence=min_tracking_confidence,
+                                      model_complexity=model_complexity)
+
+    try:
+        yield pose
+    except BaseException:
+        # Don't hand a graph in an unknown state to the next video
+        pose.close()
+        raise
+
+    # Forget this video's tracking state before the graph is reused
+    pose.reset()
+    with _idle_lock:
+        if key in _idle_poses:
+            pose.close()
+        else:
+            _idle_poses[key] = pose
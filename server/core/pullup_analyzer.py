@@ -1,138 +1,150 @@
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
+from functools import lru_cache
+from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+from .pose_landmarker import create_pose
+from .video_reader import open_capture, read_frames, pose_frames, pose_stride
+from .video_writer import VideoWriter
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
 
-def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
+# Joints that get a marker on the skeleton overlay
+KEY_JOINTS = (0, 11, 12, 13, 14, 15, 16)
+
+def calculate_angles(a, b, c):
+    """Calculate the angle at b formed by a-b-c for each matching row of a, b, c"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    c = np.asarray(c, dtype=float)
     
     ba = a - b
     bc = c - b
     
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+    cosine_angle = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
     cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
     
-    return int(np.degrees(np.arccos(cosine_angle)))
+    return [int(d) for d in np.degrees(np.arccos(cosine_angle))]
 
 def get_key_metrics(landmarks, width, height):
     """Extract key metrics for pullup analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
     metrics = {}
     
     try:
         # Elbow angles (shoulder-elbow-wrist) - Extension
-        l_shoulder = pixel_coord(11)
-        l_elbow = pixel_coord(13)
-        l_wrist = pixel_coord(15)
-        metrics['left_extension'] = calculate_angle(l_shoulder, l_elbow, l_wrist)
-        
-        r_shoulder = pixel_coord(12)
-        r_elbow = pixel_coord(14)
-        r_wrist = pixel_coord(16)
-        metrics['right_extension'] = calculate_angle(r_shoulder, r_elbow, r_wrist)
+        l_shoulder, l_elbow, l_wrist, r_shoulder, r_elbow, r_wrist, nose = landmarks_to_pixels(
+            landmarks, width, height, (11, 13, 15, 12, 14, 16, 0)
+        )
+        metrics['left_extension'], metrics['right_extension'] = calculate_angles(
+            [l_shoulder, r_shoulder], [l_elbow, r_elbow], [l_wrist, r_wrist]
+        )
         
         # Chin over bar check
         # We need nose position relative to wrists
-        nose = pixel_coord(0)
-        metrics['nose_y'] = nose[1]
-        metrics['left_wrist_y'] = l_wrist[1]
-        metrics['right_wrist_y'] = r_wrist[1]
+        metrics['nose_y'] = int(nose[1])
+        metrics['left_wrist_y'] = int(l_wrist[1])
+        metrics['right_wrist_y'] = int(r_wrist[1])
         
     except Exception as e:
-        print(f"Error in metrics: {e}")
+        # Called on every frame; the None metrics already mark the frame as unusable
         metrics = {k: None for k in ['left_extension', 'right_extension', 'nose_y', 'left_wrist_y', 'right_wrist_y']}
     
     return metrics
 
-def add_info_panel(image, frame, fps, reps, current_extension, state):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, state):
+    """Render the info panel strip; cached since state/reps rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
     panel[:, :] = (40, 40, 40)
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
-    
-    # Add info
-    time_sec = frame / fps if fps > 0 else 0
-    
     # Left side: State
-    cv2.putText(image_with_panel, f"State: {state}", 
-               (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
+    cv2.putText(panel, f"State: {state}", 
+               (20, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
     
     # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Ext: {current_extension}", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
     
     # Right side: Range info
-    cv2.putText(image_with_panel, "Target Range:", 
-               (w - 250, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, "• Chin over bar", 
-               (w - 250, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Full extension", 
-               (w - 250, new_h - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    
-    return image_with_panel
+    cv2.putText(panel, "Target Range:", 
+               (w - 250, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, "• Chin over bar", 
+               (w - 250, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Full extension", 
+               (w - 250, PANEL_HEIGHT - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    
+    return panel
+
+def add_info_panel(image, frame, fps, reps, current_extension, state):
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
+    
+    # Reuse the cached strip; only the extension changes every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, state)
+    
+    cv2.putText(image, f"Ext: {current_extension}", 
+               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
+    
+    return image
 
-def analyze_pullup_video(video_path, output_path=None):
+def analyze_pullup_video(video_path, output_path=None, model_complexity=0):
     if not os.path.exists(video_path): return {"error": "Video not found"}
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened(): return {"error": "Cannot open video"}
     
     fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Only every skip-th frame is decoded and analyzed (~15 per second);
+    # the output video plays at that reduced rate
+    skip = pose_stride(fps)
+    
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps / skip) if output_path else None
     
     rep_data = []
     state = "down" # down, up
     rep_count = 0
     current_rep_max_extension = 0
+    # Running sum for the average in the summary
+    sum_extension = 0
     
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=1) as pose:
+    canvas = None
+
+    with create_pose(fps, skip, model_complexity, min_detection_confidence=0.7, min_tracking_confidence=0.7) as pose:
         frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
+        # Decoding and inference each run on their own thread ahead of the drawing below
+        for frame_rgb, results in pose_frames(read_frames(cap, skip=skip), pose):
             
-            frame_count += 1
+            frame_count += skip
             
-            # RGB for MediaPipe
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
-            results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
+            # Output canvas, reused every frame: the frame is copied into its top rows
+            # and the info panel is drawn into the bottom rows.
+            # Nothing is drawn when there is no output video to write.
+            if writer is not None:
+                frame_h, frame_w = frame_rgb.shape[:2]
+                if canvas is None:
+                    canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                image_rgb = canvas[:frame_h]
+                image_rgb[:] = frame_rgb
             
             current_ext = 0
             
             if results.pose_landmarks:
-                mp_drawing.draw_landmarks(image_rgb, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
-                landmarks = results.pose_landmarks.landmark
+                landmarks = landmarks_array(results.pose_landmarks.landmark)
+                if writer is not None:
+                    draw_skeleton(image_rgb, landmarks, KEY_JOINTS,
+                                  line_color=(224, 224, 224), joint_color=(0, 0, 255))
                 
                 metrics = get_key_metrics(landmarks, width, height)
                 
                 # Side detection logic
                 track_side = "left"
-                l_vis = (landmarks[11].visibility + landmarks[13].visibility + landmarks[15].visibility) / 3
-                r_vis = (landmarks[12].visibility + landmarks[14].visibility + landmarks[16].visibility) / 3
+                l_vis = landmarks[(11, 13, 15), 2].sum() / 3
+                r_vis = landmarks[(12, 14, 16), 2].sum() / 3
                 
                 if r_vis > l_vis and metrics['right_extension'] is not None:
                     track_side = "right"
@@ -170,31 +182,23 @@ def analyze_pullup_video(video_path, output_path=None):
                          
                          # Better: Store just the extension we see.
                          if current_rep_max_extension > 0:
+                             sum_extension += current_rep_max_extension
                              rep_data.append({
                                  "rep": rep_count,
                                  "extension": current_rep_max_extension
                              })
 
             # Overlay
-            final_image = add_info_panel(image_rgb, frame_count, fps, rep_count, current_ext, state)
-            output_frames.append(final_image)
+            if writer is not None:
+                final_image = add_info_panel(canvas, frame_count, fps, rep_count, current_ext, state)
+                writer.write(final_image)
             
     cap.release()
     
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            # Fix for Real Time Coach video speed
-            if "recorded_video" in os.path.basename(video_path) and len(output_frames) > 0:
-                fps = len(output_frames) / 10.0
-                print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
-
-            # Ensure FPS is valid
-            if fps <= 0 or fps > 120: fps = 30.0
-
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             print(f"Error writing video: {e}")
             return {"error": str(e)}
@@ -204,7 +208,7 @@ def analyze_pullup_video(video_path, output_path=None):
     corrections = []
     
     if rep_data:
-        avg_extension = np.mean([r["extension"] for r in rep_data])
+        avg_extension = sum_extension / len(rep_data)
         
         if avg_extension < 140:
              feedback.append("Poor Extension")
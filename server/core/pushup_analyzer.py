@@ -1,13 +1,19 @@
 
 import cv2
-import mediapipe as mp
+import math
 import numpy as np
 import os
-from .biomechanics import get_exercise_angles, get_exercise_errors
+from functools import lru_cache
+from .pose_landmarker import create_pose
+from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+from .video_reader import open_capture, read_frames, pose_frames, pose_stride
+from .video_writer import VideoWriter
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
+# Joints that get a marker on the skeleton overlay
+KEY_JOINTS = (11, 12, 13, 14, 15, 16, 23, 24, 27, 28)
 
 # NSCA Push-Up Standards (Embedded from user snippet)
 NSCA_STANDARDS = {
@@ -16,30 +22,19 @@ NSCA_STANDARDS = {
     "shoulder_angle": {"optimal": 45, "range": (40, 50)}
 }
 
-def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
+def calculate_angles(a, b, c):
+    """Calculate the angle at b formed by a-b-c for each matching row of a, b, c"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    c = np.asarray(c, dtype=float)
     
     ba = a - b
     bc = c - b
     
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+    cosine_angle = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
     cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
     
-    return int(np.degrees(np.arccos(cosine_angle)))
-
-def calculate_torso_angle(shoulder, hip, ankle):
-    """Calculate torso angle relative to horizontal line"""
-    shoulder = np.array(shoulder)
-    hip = np.array(hip)
-    ankle = np.array(ankle)
-    
-    # Create horizontal reference line at hip level
-    horizontal_point = (hip[0] + 100, hip[1])
-    
-    return calculate_angle(horizontal_point, hip, shoulder)
+    return [int(d) for d in np.degrees(np.arccos(cosine_angle))]
 
 def get_form_rating(elbow_angle, hip_drop):
     """Rate push-up form"""
@@ -65,63 +60,41 @@ def get_form_rating(elbow_angle, hip_drop):
 
 def get_key_metrics(landmarks, width, height):
     """Extract key metrics for push-up analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
     metrics = {}
     
     try:
-        # Left elbow
-        l_shoulder = pixel_coord(11)
-        l_elbow = pixel_coord(13)
-        l_wrist = pixel_coord(15)
-        metrics['left_elbow'] = calculate_angle(l_shoulder, l_elbow, l_wrist)
-        
-        # Right elbow
-        r_shoulder = pixel_coord(12)
-        r_elbow = pixel_coord(14)
-        r_wrist = pixel_coord(16)
-        metrics['right_elbow'] = calculate_angle(r_shoulder, r_elbow, r_wrist)
-        
-        # Shoulder angle (relative to torso)
-        shoulder_mid = (
-            (l_shoulder[0] + r_shoulder[0]) // 2,
-            (l_shoulder[1] + r_shoulder[1]) // 2
-        )
-        hip_mid = (
-            (pixel_coord(23)[0] + pixel_coord(24)[0]) // 2,
-            (pixel_coord(23)[1] + pixel_coord(24)[1]) // 2
+        (l_shoulder, l_elbow, l_wrist, r_shoulder, r_elbow, r_wrist,
+         l_hip, r_hip, l_ankle, r_ankle) = landmarks_to_pixels(
+            landmarks, width, height, (11, 13, 15, 12, 14, 16, 23, 24, 27, 28)
         )
+        shoulder_mid = (l_shoulder + r_shoulder) // 2
+        hip_mid = (l_hip + r_hip) // 2
+        ankle_mid = (l_ankle + r_ankle) // 2
         
-        # Calculate angle between upper arm and torso
-        metrics['shoulder_angle'] = calculate_angle(l_elbow, l_shoulder, hip_mid)
+        # Horizontal reference line at hip level for the body alignment angle
+        horizontal_point = hip_mid + (100, 0)
         
-        # Torso straightness (hip drop)
-        l_ankle = pixel_coord(27)
-        r_ankle = pixel_coord(28)
-        ankle_mid = (
-            (l_ankle[0] + r_ankle[0]) // 2,
-            (l_ankle[1] + r_ankle[1]) // 2
+        # Left elbow, right elbow, upper arm vs torso and body alignment in one pass
+        left_elbow, right_elbow, shoulder_angle, torso_angle = calculate_angles(
+            [l_shoulder, r_shoulder, l_elbow, horizontal_point],
+            [l_elbow, r_elbow, l_shoulder, hip_mid],
+            [l_wrist, r_wrist, hip_mid, shoulder_mid]
         )
+        metrics['left_elbow'] = left_elbow
+        metrics['right_elbow'] = right_elbow
+        metrics['shoulder_angle'] = shoulder_angle
         
-        # Create line from shoulder to ankle
-        shoulder_ankle_line = np.array(ankle_mid) - np.array(shoulder_mid)
-        
-        # Calculate distance from hip to line (hip drop)
-        hip_point = np.array(hip_mid)
-        shoulder_point = np.array(shoulder_mid)
-        
-        # Vector math for point-line distance
-        line_vec = np.array(ankle_mid) - shoulder_point
-        point_vec = hip_point - shoulder_point
-        cross = np.cross(line_vec, point_vec)
-        distance = np.linalg.norm(cross) / np.linalg.norm(line_vec)
+        # Torso straightness (hip drop): distance from hip to the shoulder-ankle line
+        # (plain int arithmetic; NumPy call overhead dominates on 2-vectors)
+        lvx, lvy = (ankle_mid - shoulder_mid).tolist()
+        pvx, pvy = (hip_mid - shoulder_mid).tolist()
+        cross = lvx * pvy - lvy * pvx
+        distance = abs(cross) / math.sqrt(lvx * lvx + lvy * lvy)
         
         metrics['hip_drop'] = int(distance)
         
         # Body alignment angle
-        metrics['torso_angle'] = calculate_torso_angle(shoulder_mid, hip_mid, ankle_mid)
+        metrics['torso_angle'] = torso_angle
         
     except Exception as e:
         metrics = {k: None for k in ['left_elbow', 'right_elbow', 'shoulder_angle', 
@@ -157,48 +130,48 @@ def add_metric_overlays(image, metrics):
     
     return image
 
-def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle, hip_drop):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, current_elbow_angle):
+    """Render the info panel strip; cached since reps/elbow rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
     panel[:, :] = (40, 40, 40)
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Middle: Rep info
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    cv2.putText(panel, f"Elbow: {current_elbow_angle}", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
-    # Add info
-    time_sec = frame / fps if fps > 0 else 0
+    # Right side: NSCA standard
+    cv2.putText(panel, "NSCA Standard:", 
+               (w - 250, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, " Elbows at 90", 
+               (w - 250, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    
+    return panel
+
+def add_info_panel(image, frame, total_frames, fps, reps, current_elbow_angle, hip_drop):
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
+    
+    # Reuse the cached strip; only the frame counter changes every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, current_elbow_angle)
     
     # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Elbow: {current_elbow_angle}", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
-    
-    # Right side: NSCA standard
-    cv2.putText(image_with_panel, "NSCA Standard:", 
-               (w - 250, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, " Elbows at 90", 
-               (w - 250, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-
-    return image_with_panel
+    return image
 
-def analyze_pushup_video(video_path, output_path=None):
+def analyze_pushup_video(video_path, output_path=None, model_complexity=1):
     """
-    Main pushup analysis function adapted for web backend
+    Main pushup analysis function adapted for web backend.
+    model_complexity=0 selects the faster Lite pose model.
     """
     if not os.path.exists(video_path):
         return {"error": "Video not found"}
     
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened():
         return {"error": "Cannot open video"}
     
@@ -207,36 +180,46 @@ def analyze_pushup_video(video_path, output_path=None):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Only every skip-th frame is decoded and analyzed (~15 per second);
+    # the output video plays at that reduced rate
+    skip = pose_stride(fps)
+    
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps / skip) if output_path else None
     
     rep_data = []
     in_pushup = False
+    # Running sums for the averages in the summary
+    sum_min_elbow_angle = 0
+    sum_max_hip_drop = 0
     rep_count = 0
     min_elbow_angle = 180
     max_hip_drop = 0
     
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=1) as pose:
+    canvas = None
+
+    with create_pose(fps, skip, model_complexity, min_detection_confidence=0.7, min_tracking_confidence=0.7) as pose:
         frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
+        # Decoding and inference each run on their own thread ahead of the drawing below
+        for frame_rgb, results in pose_frames(read_frames(cap, skip=skip), pose):
             
-            frame_count += 1
+            frame_count += skip
             
-            # Process frame
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
-            results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
+            # Output canvas, reused every frame: the frame is copied into its top rows
+            # and the info panel is drawn into the bottom rows.
+            # Nothing is drawn when there is no output video to write.
+            if writer is not None:
+                frame_h, frame_w = frame_rgb.shape[:2]
+                if canvas is None:
+                    canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                image_rgb = canvas[:frame_h]
+                image_rgb[:] = frame_rgb
             
             if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    image_rgb, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2)
-                )
+                landmarks = landmarks_array(results.pose_landmarks.landmark)
+                if writer is not None:
+                    draw_skeleton(image_rgb, landmarks, KEY_JOINTS)
                 
-                landmarks = results.pose_landmarks.landmark
                 metrics = get_key_metrics(landmarks, width, height)
                 
                 if metrics['left_elbow'] is not None:
@@ -255,6 +238,8 @@ def analyze_pushup_video(video_path, output_path=None):
                     if in_pushup and metrics['left_elbow'] > 160:
                         in_pushup = False
                         rep_count += 1
+                        sum_min_elbow_angle += min_elbow_angle
+                        sum_max_hip_drop += max_hip_drop
                         rep_data.append({
                             "rep": rep_count,
                             "min_elbow_angle": min_elbow_angle,
@@ -263,25 +248,20 @@ def analyze_pushup_video(video_path, output_path=None):
                             "shoulder_angle": metrics.get('shoulder_angle', None)
                         })
                 
-                image_rgb = add_metric_overlays(image_rgb, metrics)
+                if writer is not None:
+                    image_rgb = add_metric_overlays(image_rgb, metrics)
             
             # Add info panel
-            final_image = add_info_panel(image_rgb, frame_count, total_frames, fps, rep_count, min_elbow_angle, max_hip_drop)
-            output_frames.append(final_image)
+            if writer is not None:
+                final_image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, min_elbow_angle, max_hip_drop)
+                writer.write(final_image)
 
     cap.release()
     
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            # Fix for Real Time Coach video speed
-            if "recorded_video" in os.path.basename(video_path) and len(output_frames) > 0:
-                fps = len(output_frames) / 10.0
-                print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
-
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             return {"error": str(e)}
 
@@ -291,8 +271,8 @@ def analyze_pushup_video(video_path, output_path=None):
     corrections = []
     
     if rep_data:
-        avg_depth = np.mean([rep["min_elbow_angle"] for rep in rep_data])
-        avg_hip_drop = np.mean([rep["max_hip_drop"] for rep in rep_data])
+        avg_depth = sum_min_elbow_angle / len(rep_data)
+        avg_hip_drop = sum_max_hip_drop / len(rep_data)
         
         if avg_depth > 100:
             feedback_summary.append("Insufficient Depth")
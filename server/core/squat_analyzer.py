@@ -1,13 +1,19 @@
 
 import cv2
-import mediapipe as mp
+import math
 import numpy as np
 import os
-from .biomechanics import get_exercise_angles, get_exercise_errors
+from functools import lru_cache
+from .pose_landmarker import create_pose
+from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+from .video_reader import open_capture, read_frames, pose_frames, pose_stride
+from .video_writer import VideoWriter
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
+
+# Joints that get a marker on the skeleton overlay
+KEY_JOINTS = (11, 12, 23, 24, 25, 26, 27, 28)
 
 # NSCA Squat Standards (Embedded from user snippet)
 NSCA_STANDARDS = {
@@ -17,18 +23,14 @@ NSCA_STANDARDS = {
 }
 
 def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-    
-    ba = a - b
-    bc = c - b
+    """Calculate the angle at b formed by a-b-c; plain float math, NumPy only adds overhead on 2D points"""
+    bax, bay = a[0] - b[0], a[1] - b[1]
+    bcx, bcy = c[0] - b[0], c[1] - b[1]
     
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+    cosine_angle = (bax * bcx + bay * bcy) / (math.sqrt(bax * bax + bay * bay) * math.sqrt(bcx * bcx + bcy * bcy))
+    cosine_angle = min(max(cosine_angle, -1.0), 1.0)
     
-    return int(np.degrees(np.arccos(cosine_angle)))
+    return int(math.degrees(math.acos(cosine_angle)))
 
 def get_depth_rating(knee_angle):
     """Rate squat depth"""
@@ -44,46 +46,25 @@ def get_depth_rating(knee_angle):
         return "Very Deep"
 
 def get_key_angles(landmarks, width, height):
-    """Extract key angles for squat analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
+    """Extract the left knee and torso angles used for rep counting and the overlay"""
     angles = {}
     
     try:
-        # Left knee
-        l_hip = pixel_coord(23)
-        l_knee = pixel_coord(25)
-        l_ankle = pixel_coord(27)
-        angles['left_knee'] = calculate_angle(l_hip, l_knee, l_ankle)
-        
-        # Right knee
-        r_hip = pixel_coord(24)
-        r_knee = pixel_coord(26)
-        r_ankle = pixel_coord(28)
-        angles['right_knee'] = calculate_angle(r_hip, r_knee, r_ankle)
+        l_hip, l_knee, l_ankle, r_hip, l_shoulder, r_shoulder = landmarks_to_pixels(
+            landmarks, width, height, (23, 25, 27, 24, 11, 12)
+        ).tolist()
         
-        # Torso lean
-        l_shoulder = pixel_coord(11)
-        r_shoulder = pixel_coord(12)
-        shoulder_mid = (
-            (l_shoulder[0] + r_shoulder[0]) // 2,
-            (l_shoulder[1] + r_shoulder[1]) // 2
-        )
-        hip_mid = (
-            (l_hip[0] + r_hip[0]) // 2,
-            (l_hip[1] + r_hip[1]) // 2
-        )
+        # Torso lean is measured against a vertical line through the hip midpoint
+        shoulder_mid = ((l_shoulder[0] + r_shoulder[0]) // 2, (l_shoulder[1] + r_shoulder[1]) // 2)
+        hip_mid = ((l_hip[0] + r_hip[0]) // 2, (l_hip[1] + r_hip[1]) // 2)
         vertical_point = (hip_mid[0], hip_mid[1] - 100)
-        angles['torso'] = calculate_angle(vertical_point, hip_mid, shoulder_mid)
         
-        # Hip angle
-        angles['left_hip'] = calculate_angle(l_shoulder, l_hip, l_knee)
-        angles['right_hip'] = calculate_angle(r_shoulder, r_hip, r_knee)
+        angles['left_knee'] = calculate_angle(l_hip, l_knee, l_ankle)
+        angles['torso'] = calculate_angle(vertical_point, hip_mid, shoulder_mid)
         
-    except:
-        angles = {k: None for k in ['left_knee', 'right_knee', 'torso', 'left_hip', 'right_hip']}
+    except ZeroDivisionError:
+        # Coincident landmarks leave the angle undefined
+        angles = {k: None for k in ['left_knee', 'torso']}
     
     return angles
 
@@ -109,41 +90,40 @@ def add_angle_overlays(image, angles):
     
     return image
 
-def add_info_panel(image, frame, total_frames, fps, reps, current_knee_angle):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, current_knee_angle):
+    """Render the info panel strip; cached since reps/knee rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
     panel[:, :] = (40, 40, 40)
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Middle: Rep info
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    cv2.putText(panel, f"Current Knee: {current_knee_angle}", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
-    # Add info
-    time_sec = frame / fps if fps > 0 else 0
+    # Right side: NSCA standard
+    cv2.putText(panel, "NSCA Standard:", 
+               (w - 250, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, " Parallel depth (90)", 
+               (w - 250, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    
+    return panel
+
+def add_info_panel(image, frame, total_frames, fps, reps, current_knee_angle):
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
+    
+    # Reuse the cached strip; only the frame counter changes every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, current_knee_angle)
     
     # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Current Knee: {current_knee_angle}", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
-    
-    # Right side: NSCA standard (Simplified for video)
-    cv2.putText(image_with_panel, "NSCA Standard:", 
-               (w - 250, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, " Parallel depth (90)", 
-               (w - 250, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-
-    return image_with_panel
+    return image
 
-def analyze_squat_video(video_path, output_path=None):
+def analyze_squat_video(video_path, output_path=None, model_complexity=0):
     """
     Main analysis function adapted for backend
     Returns: Dictionary with analysis results
@@ -151,7 +131,7 @@ def analyze_squat_video(video_path, output_path=None):
     if not os.path.exists(video_path):
         return {"error": "Video not found"}
     
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened():
         return {"error": "Cannot open video"}
     
@@ -160,56 +140,59 @@ def analyze_squat_video(video_path, output_path=None):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
-    output_frames = []
+    # Only every skip-th frame is decoded and analyzed (~15 per second);
+    # the output video plays at that reduced rate
+    skip = pose_stride(fps)
+    
+    # Frames are streamed to the encoder as they are rendered
+    writer = VideoWriter(video_path, output_path, fps / skip) if output_path else None
 
     rep_data = []
     in_squat = False
     rep_count = 0
     min_knee_angle = 180
     
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7, model_complexity=1) as pose:
+    canvas = None
+
+    with create_pose(fps, skip, model_complexity, min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
         frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # Decoding and inference each run on their own thread ahead of the drawing below
+        for frame_rgb, results in pose_frames(read_frames(cap, skip=skip), pose):
             
-            frame_count += 1
+            frame_count += skip
             
-            # Process frame
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image_rgb.flags.writeable = False
-            results = pose.process(image_rgb)
-            image_rgb.flags.writeable = True
+            # Output canvas, reused every frame: the frame is copied into its top rows
+            # and the info panel is drawn into the bottom rows
+            frame_h, frame_w = frame_rgb.shape[:2]
+            if canvas is None:
+                canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+            image_rgb = canvas[:frame_h]
+            image_rgb[:] = frame_rgb
             
             current_angle_val = 0
 
             # Draw skeleton for output video
             if results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    image_rgb, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2)
-                )
-                
-                landmarks = results.pose_landmarks.landmark
+                landmarks = landmarks_array(results.pose_landmarks.landmark)
+                draw_skeleton(image_rgb, landmarks, KEY_JOINTS)
                 
                 # Calculate key angles using new logic
                 angles = get_key_angles(landmarks, width, height)
                 
-                if angles['left_knee'] is not None:
-                    current_angle_val = angles['left_knee']
+                knee_angle = angles['left_knee']
+                if knee_angle is not None:
+                    current_angle_val = knee_angle
                     
                     # Detect squat reps (Logic from snippet)
-                    if not in_squat and angles['left_knee'] < 150:
+                    if not in_squat and knee_angle < 150:
                         in_squat = True
                         min_knee_angle = 180
                     
                     if in_squat:
-                        if angles['left_knee'] < min_knee_angle:
-                            min_knee_angle = angles['left_knee']
+                        if knee_angle < min_knee_angle:
+                            min_knee_angle = knee_angle
                     
-                    if in_squat and angles['left_knee'] > 160:
+                    if in_squat and knee_angle > 160:
                         in_squat = False
                         rep_count += 1
                         rep_data.append({
@@ -222,22 +205,16 @@ def analyze_squat_video(video_path, output_path=None):
                 image_rgb = add_angle_overlays(image_rgb, angles)
             
             # Add info panel
-            final_image = add_info_panel(image_rgb, frame_count, total_frames, fps, rep_count, min_knee_angle)
-            output_frames.append(final_image)
+            final_image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, min_knee_angle)
+            if writer is not None:
+                writer.write(final_image)
 
     cap.release()
     
-    # Write using MoviePy
-    if output_path and output_frames:
+    # Finish output video
+    if writer is not None:
         try:
-            # Fix for Real Time Coach video speed
-            if "recorded_video" in os.path.basename(video_path) and len(output_frames) > 0:
-                fps = len(output_frames) / 10.0
-                print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
-
-            from moviepy.editor import ImageSequenceClip
-            clip = ImageSequenceClip(output_frames, fps=fps)
-            clip.write_videofile(output_path, codec='libx264', audio=False, logger=None, preset='ultrafast', threads=4)
+            writer.close()
         except Exception as e:
             print(f"Error writing video: {e}")
             return {"error": str(e)}
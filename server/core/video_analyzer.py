@@ -1,11 +1,50 @@
 import cv2
-import mediapipe as mp
+import math
 import numpy as np
 import time
 import os
 import sys
+from collections import deque
 
-def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True):
+try:
+    from .landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+    from .pose_landmarker import create_pose
+    from .video_reader import (open_capture, read_frames, detect_frames, downscale_for_inference,
+                               motion_thumbnail, can_reuse_pose, skip_pose_frame, INFERENCE_MAX_SIZE)
+    from .video_writer import ThreadedWriter, VideoWriter
+except ImportError:
+    # Run as a script from server/core
+    from landmarks import landmarks_array, landmarks_to_pixels, draw_skeleton
+    from pose_landmarker import create_pose
+    from video_reader import (open_capture, read_frames, detect_frames, downscale_for_inference,
+                              motion_thumbnail, can_reuse_pose, skip_pose_frame, INFERENCE_MAX_SIZE)
+    from video_writer import ThreadedWriter, VideoWriter
+
+# Every landmark gets a marker, as mp_drawing.draw_landmarks did
+ALL_JOINTS = range(33)
+
+# Frames waiting for the encoder thread
+WRITE_QUEUE_SIZE = 4
+
+# Highest rate at which the preview window is refreshed
+PREVIEW_FPS = 30
+
+# Console lines waiting for the logging thread
+LOG_QUEUE_SIZE = 64
+
+# Frames skipped by the F/B keys; this many recent frames are kept so B needs no decoder seek
+SEEK_FRAMES = 60
+
+# Angles shown on the video: (label, a, b, c) for the angle at landmark b
+ANGLE_JOINTS = (
+    ("L Elbow", 11, 13, 15), ("L Shoulder", 23, 11, 13),
+    ("R Elbow", 12, 14, 16), ("R Shoulder", 24, 12, 14),
+    ("L Knee", 23, 25, 27), ("R Knee", 24, 26, 28),
+)
+ANGLE_TRIPLES = np.array([joints for _, *joints in ANGLE_JOINTS])
+
+def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True, model_complexity=1,
+                                inference_size=INFERENCE_MAX_SIZE):
     """
     Analyze video and show skeleton overlay throughout
     
@@ -13,6 +52,8 @@ def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True
         video_path: Path to input video
         output_video: Path to save analyzed video (optional)
         show_preview: Show live preview window
+        model_complexity: Pose model, 0=Lite, 1=Full, 2=Heavy (about 2-3x slower per step)
+        inference_size: Longest side of the frame copy passed to the pose model
     """
     
     print("=" * 60)
@@ -27,22 +68,8 @@ def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True
         print(f"   Files in directory: {os.listdir('.')}")
         return None
     
-    # Initialize MediaPipe
-    mp_pose = mp.solutions.pose
-    mp_drawing = mp.solutions.drawing_utils
-    mp_drawing_styles = mp.solutions.drawing_styles
-    
-    # Create Pose instance
-    pose = mp_pose.Pose(
-        static_image_mode=False,
-        model_complexity=2,  # 0=Light, 1=Full, 2=Heavy
-        smooth_landmarks=True,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-    
     # Open video file
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     
     if not cap.isOpened():
         print("❌ ERROR: Cannot open video file!")
@@ -67,21 +94,28 @@ def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True
     print(f"   Duration: {duration:.1f} seconds")
     print("-" * 60)
     
+    # High frame rate videos only refresh the window at about PREVIEW_FPS
+    show_every = max(1, round(fps / PREVIEW_FPS)) if 0 < fps <= 240 else 1
+    
     # Prepare output video writer
     out = None
     if output_video:
         # Create output directory if needed
         os.makedirs(os.path.dirname(output_video) if os.path.dirname(output_video) else '.', exist_ok=True)
         
-        # Define codec and create VideoWriter
-        # Use avc1 for better browser/macOS compatibility
-        fourcc = cv2.VideoWriter_fourcc(*'avc1') 
-        out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
+        # H.264 through ffmpeg (NVENC where available, else libx264) for browser/macOS
+        # compatibility; the size is taken from the first frame written. Any input keeps
+        # its own FPS and is streamed (no Real Time Coach re-timing here)
+        out = VideoWriter(video_path, output_video, fps, pix_fmt='bgr24', coach_recordings=False)
+        # Encoding runs on its own thread so it overlaps with pose inference
+        out_thread = ThreadedWriter(out.write, maxsize=WRITE_QUEUE_SIZE)
         print(f"💾 Will save analyzed video to: {output_video}")
     
     # Initialize variables
     frame_count = 0
     pose_detected_count = 0
+    # Angles of the last frame with a pose, also shown while the pose is lost
+    angles_to_display = []
     start_time = time.time()
     
     # Color scheme for different body parts
@@ -103,229 +137,259 @@ def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True
     print("   Press 'S' to save screenshot")
     print("-" * 60)
     
-    paused = False
-    last_print_time = time.time()
-    
-    while True:
-        if not paused:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Show progress every 50 frames or 5 seconds
-            current_time = time.time()
-            if current_time - last_print_time > 5.0:
-                progress = (frame_count / total_frames) * 100
-                elapsed = current_time - start_time
-                eta = (elapsed / frame_count) * (total_frames - frame_count) if frame_count > 0 else 0
-                
-                print(f"   Progress: {progress:.1f}% ({frame_count}/{total_frames}) | "
-                      f"Elapsed: {elapsed:.1f}s | ETA: {eta:.1f}s")
-                last_print_time = current_time
-            
-            # Convert BGR to RGB for MediaPipe
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_rgb.flags.writeable = False
-            
-            # Process with MediaPipe
-            results = pose.process(frame_rgb)
-            
-            # Convert back to BGR for OpenCV
-            frame_rgb.flags.writeable = True
-            frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-            
-            if results.pose_landmarks:
-                pose_detected_count += 1
+    # Pose model (the GPU PoseLandmarker when POSE_LANDMARKER_MODEL is set)
+    with create_pose(fps, model_complexity=model_complexity,
+                     min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        
+        paused = False
+        last_print_time = time.time()
+        # Console output is written on its own thread, so a slow terminal never stalls the loop
+        log = ThreadedWriter(print, maxsize=LOG_QUEUE_SIZE)
+        rgb_buf = None
+        # Motion thumbnail of the last inferred frame, and how many frames have reused its results
+        results = None
+        inferred_thumbnail = None
+        reused = 0
+        
+        # Output canvases (frame + info strip), reused in turn; one more than the writer
+        # thread can have queued or in hand, so a canvas is never redrawn before it is written
+        overlay_height = 120
+        canvases = [None] * (WRITE_QUEUE_SIZE + 2)
+        canvas_slot = 0
+        
+        # The preview window is created once; the loop only refreshes it
+        if show_preview:
+            cv2.namedWindow('Exercise Analysis - Skeleton Overlay', cv2.WINDOW_NORMAL)
+            cv2.resizeWindow('Exercise Analysis - Skeleton Overlay', min(1280, width), min(800, height + overlay_height))
+        
+        # Decoding runs ahead on a background thread; inference and the window stay on this one
+        frames = read_frames(cap, maxsize=8)
+        # Without a window nothing can pause or seek, so inference also moves to its
+        # own thread and overlaps with drawing and encoding the previous frames
+        detections = None if show_preview else detect_frames(frames, pose, max_size=inference_size)
+        
+        # Undrawn copies of the last SEEK_FRAMES frames, and the ones B stepped back over
+        # (next frame last); these are shown again before decoding carries on.
+        # frame_count is always the position of the current frame plus one, also after seeks
+        recent = deque(maxlen=SEEK_FRAMES)
+        replay = []
+        
+        try:
+            while True:
+                if not paused:
+                    if detections is not None:
+                        frame, results = next(detections, (None, None))
+                    elif replay:
+                        frame = replay.pop()
+                    else:
+                        frame = next(frames, None)
+                    if frame is None:
+                        break
+                    if show_preview:
+                        # Drawing below happens on the frame itself
+                        recent.append(frame.copy())
                 
-                # Draw full skeleton with custom styling
-                mp_drawing.draw_landmarks(
-                    frame,
-                    results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(
-                        color=skeleton_color, thickness=3, circle_radius=3
-                    ),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(
-                        color=skeleton_color, thickness=2
-                    )
-                )
+                    frame_count += 1
                 
-                # Get all landmarks
-                landmarks = results.pose_landmarks.landmark
-                h, w = frame.shape[:2]
+                    # Show progress every 50 frames or 5 seconds
+                    current_time = time.time()
+                    if current_time - last_print_time > 5.0:
+                        progress = (frame_count / total_frames) * 100
+                        elapsed = current_time - start_time
+                        eta = (elapsed / frame_count) * (total_frames - frame_count) if frame_count > 0 else 0
+                    
+                        log.write(f"   Progress: {progress:.1f}% ({frame_count}/{total_frames}) | "
+                                  f"Elapsed: {elapsed:.1f}s | ETA: {eta:.1f}s")
+                        last_print_time = current_time
                 
-                # Function to convert normalized coordinates to pixel coordinates
-                def get_pixel_coord(landmark_idx):
-                    lm = landmarks[landmark_idx]
-                    return (int(lm.x * w), int(lm.y * h))
+                    if detections is None:
+                        # Convert a downscaled copy to RGB for MediaPipe into a buffer reused
+                        # every frame; landmarks are normalized, so they still apply to the
+                        # full-size BGR frame that gets drawn on
+                        small = downscale_for_inference(frame, inference_size)
+                        if rgb_buf is None or rgb_buf.shape != small.shape:
+                            rgb_buf = np.empty_like(small)
+                        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+                    
+                        # Process with MediaPipe, unless the frame has barely changed since the
+                        # last inference and its landmarks were clearly visible
+                        thumbnail = motion_thumbnail(rgb_buf)
+                        if can_reuse_pose(results, thumbnail, inferred_thumbnail, reused):
+                            reused += 1
+                            skip_pose_frame(pose)
+                        else:
+                            results = pose.process(rgb_buf)
+                            inferred_thumbnail = thumbnail
+                            reused = 0
                 
-                # Calculate and display key angles
-                angles_to_display = []
+                    # Frames that are neither shown nor saved are analyzed but not drawn
+                    show = show_preview and (frame_count - 1) % show_every == 0
+                    draw = show or out is not None
                 
-                # LEFT ARM ANGLES
-                try:
-                    l_shoulder = get_pixel_coord(11)
-                    l_elbow = get_pixel_coord(13)
-                    l_wrist = get_pixel_coord(15)
+                    if results.pose_landmarks:
+                        pose_detected_count += 1
                     
-                    # Calculate left elbow angle
-                    l_elbow_angle = calculate_angle(l_shoulder, l_elbow, l_wrist)
-                    angles_to_display.append(("L Elbow", l_elbow_angle, l_elbow))
+                        # Normalized landmarks as an array, read from the results once
+                        landmarks = landmarks_array(results.pose_landmarks.landmark)
+                        h, w = frame.shape[:2]
                     
-                    # Calculate left shoulder angle (hip-shoulder-elbow)
-                    l_hip = get_pixel_coord(23)
-                    l_shoulder_angle = calculate_angle(l_hip, l_shoulder, l_elbow)
-                    angles_to_display.append(("L Shoulder", l_shoulder_angle, l_shoulder))
-                except:
-                    pass
-                
-                # RIGHT ARM ANGLES
-                try:
-                    r_shoulder = get_pixel_coord(12)
-                    r_elbow = get_pixel_coord(14)
-                    r_wrist = get_pixel_coord(16)
+                        # Draw full skeleton with custom styling
+                        if draw:
+                            draw_skeleton(frame, landmarks, ALL_JOINTS,
+                                          line_color=skeleton_color, joint_color=skeleton_color, circle_radius=3)
                     
-                    # Calculate right elbow angle
-                    r_elbow_angle = calculate_angle(r_shoulder, r_elbow, r_wrist)
-                    angles_to_display.append(("R Elbow", r_elbow_angle, r_elbow))
+                        # Calculate all key angles in one pass; undefined ones (coincident joints) are skipped
+                        pixels = landmarks_to_pixels(landmarks, w, h, range(33))
+                        degrees = calculate_angles(pixels[ANGLE_TRIPLES[:, 0]], pixels[ANGLE_TRIPLES[:, 1]],
+                                                   pixels[ANGLE_TRIPLES[:, 2]])
                     
-                    # Calculate right shoulder angle
-                    r_hip = get_pixel_coord(24)
-                    r_shoulder_angle = calculate_angle(r_hip, r_shoulder, r_elbow)
-                    angles_to_display.append(("R Shoulder", r_shoulder_angle, r_shoulder))
-                except:
-                    pass
-                
-                # LEFT LEG ANGLES
-                try:
-                    l_hip = get_pixel_coord(23)
-                    l_knee = get_pixel_coord(25)
-                    l_ankle = get_pixel_coord(27)
+                        angles_to_display = []
+                        for (joint_name, _, joint, _), angle in zip(ANGLE_JOINTS, degrees.tolist()):
+                            if not math.isnan(angle):
+                                angles_to_display.append((joint_name, int(round(angle)), tuple(pixels[joint].tolist())))
                     
-                    l_knee_angle = calculate_angle(l_hip, l_knee, l_ankle)
-                    angles_to_display.append(("L Knee", l_knee_angle, l_knee))
-                except:
-                    pass
-                
-                # RIGHT LEG ANGLES
-                try:
-                    r_hip = get_pixel_coord(24)
-                    r_knee = get_pixel_coord(26)
-                    r_ankle = get_pixel_coord(28)
+                        # Display angles on frame
+                        for joint_name, angle, position in (angles_to_display if draw else ()):
+                            # Put angle text near the joint
+                            text = f"{joint_name}: {angle}°"
+                            text_position = (position[0] + 10, position[1] - 10)
+                        
+                            # Draw background rectangle for better visibility
+                            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+                            cv2.rectangle(frame,
+                                        (text_position[0] - 5, text_position[1] - text_size[1] - 5),
+                                        (text_position[0] + text_size[0] + 5, text_position[1] + 5),
+                                        (0, 0, 0), -1)
+                        
+                            # Draw angle text
+                            cv2.putText(frame, text, text_position,
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, angle_color, 2)
                     
-                    r_knee_angle = calculate_angle(r_hip, r_knee, r_ankle)
-                    angles_to_display.append(("R Knee", r_knee_angle, r_knee))
-                except:
-                    pass
-                
-                # Display angles on frame
-                for joint_name, angle, position in angles_to_display:
-                    # Put angle text near the joint
-                    text = f"{joint_name}: {angle}°"
-                    text_position = (position[0] + 10, position[1] - 10)
-                    
-                    # Draw background rectangle for better visibility
-                    text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                    cv2.rectangle(frame,
-                                (text_position[0] - 5, text_position[1] - text_size[1] - 5),
-                                (text_position[0] + text_size[0] + 5, text_position[1] + 5),
-                                (0, 0, 0), -1)
-                    
-                    # Draw angle text
-                    cv2.putText(frame, text, text_position,
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, angle_color, 2)
-                
-                # Print angles to console for selected frames
-                if frame_count % 10 == 0:  # Every 10th frame
-                    timestamp = frame_count / fps
-                    print(f"Frame {frame_count:4d} ({timestamp:5.1f}s): ", end="")
-                    for joint_name, angle, _ in angles_to_display[:2]:  # Show first 2 angles
-                        print(f"{joint_name}: {angle:3d}° ", end="")
-                    print()
-        
-        # Add informational overlay
-        overlay_height = 120
-        overlay = np.zeros((overlay_height, width, 3), dtype=np.uint8)
-        
-        # Add overlay to bottom of frame
-        frame_with_overlay = np.vstack([frame, overlay])
-        
-        # Add info text to overlay
-        info_y_start = height + 20
-        
-        # Frame info
-        timestamp = frame_count / fps if fps > 0 else 0
-        cv2.putText(frame_with_overlay, f"Frame: {frame_count}/{total_frames}",
-                   (20, info_y_start), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
-        cv2.putText(frame_with_overlay, f"Time: {timestamp:.1f}s",
-                   (20, info_y_start + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
-        
-        # Detection info
-        detection_rate = (pose_detected_count / frame_count * 100) if frame_count > 0 else 0
-        cv2.putText(frame_with_overlay, f"Pose detected: {detection_rate:.1f}%",
-                   (20, info_y_start + 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
-        
-        # Instructions
-        cv2.putText(frame_with_overlay, "Controls: Q=Quit | P=Pause | S=Screenshot",
-                   (width - 400, info_y_start), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
-        
-        # Exercise info (you can customize this)
-        cv2.putText(frame_with_overlay, "Exercise: Squat Analysis",
-                   (width - 400, info_y_start + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        
-        # Angle legend
-        if angles_to_display:
-            legend_x = width - 400
-            legend_y = info_y_start + 50
-            for i, (joint_name, angle, _) in enumerate(angles_to_display[:3]):  # Show first 3
-                cv2.putText(frame_with_overlay, f"{joint_name}: {angle}°",
-                           (legend_x, legend_y + i * 25), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, angle_color, 2)
-        
-        # Show video preview
-        if show_preview:
-            cv2.namedWindow('Exercise Analysis - Skeleton Overlay', cv2.WINDOW_NORMAL)
-            cv2.resizeWindow('Exercise Analysis - Skeleton Overlay', min(1280, width), min(800, height + overlay_height))
-            cv2.imshow('Exercise Analysis - Skeleton Overlay', frame_with_overlay)
-        
-        # Write to output video if enabled
-        if out is not None:
-            out.write(frame_with_overlay if show_preview else frame)
-        
-        # Handle keyboard input
-        key = cv2.waitKey(1 if not paused else 0) & 0xFF
-        
-        if key == ord('q') or key == 27:  # 'q' or ESC
-            print("\n⏹️  Stopping analysis...")
-            break
-        elif key == ord('p'):  # 'p' to pause/resume
-            paused = not paused
-            print(f"   {'⏸️  Paused' if paused else '▶️  Resumed'}")
-        elif key == ord('s'):  # 's' to save screenshot
-            screenshot_path = f"screenshot_frame_{frame_count}.jpg"
-            cv2.imwrite(screenshot_path, frame_with_overlay if show_preview else frame)
-            print(f"   💾 Saved screenshot: {screenshot_path}")
-        elif key == ord('f'):  # 'f' to skip forward 60 frames (2 seconds at 30fps)
-            if not paused:
-                new_pos = frame_count + 60
-                if new_pos < total_frames:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
-                    frame_count = new_pos - 1
-                    print(f"   ⏩ Skipped forward 2 seconds")
-        elif key == ord('b'):  # 'b' to skip backward 60 frames
-            if not paused:
-                new_pos = max(0, frame_count - 60)
-                cap.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
-                frame_count = new_pos - 1
-                print(f"   ⏪ Skipped backward 2 seconds")
+                        # Print angles to console for selected frames
+                        if frame_count % 10 == 0:  # Every 10th frame
+                            timestamp = frame_count / fps
+                            log.write(f"Frame {frame_count:4d} ({timestamp:5.1f}s): " +
+                                      "".join(f"{joint_name}: {angle:3d}° "
+                                              for joint_name, angle, _ in angles_to_display[:2]))  # Show first 2 angles
+            
+                # The overlay is only needed for the window, and for the output video while the
+                # window is open (a paused frame is redrawn as it waits for a key)
+                if not (show or paused or (show_preview and out is not None)):
+                    if out is not None:
+                        out_thread.write(frame)
+                    continue
+            
+                # Add informational overlay: the frame goes into the top rows of the next
+                # canvas in the ring and the overlay strip below it is cleared
+                frame_h, frame_w = frame.shape[:2]
+                if canvases[0] is None or canvases[0].shape[:2] != (frame_h + overlay_height, frame_w):
+                    canvases = [np.empty((frame_h + overlay_height, frame_w, 3), dtype=np.uint8)
+                                for _ in canvases]
+                    # Text that never changes is rendered into the strip once and copied in each frame
+                    static_strip = np.zeros((overlay_height, frame_w, 3), dtype=np.uint8)
+                    cv2.putText(static_strip, "Controls: Q=Quit | P=Pause | S=Screenshot",
+                               (width - 400, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+                    # Exercise info (you can customize this)
+                    cv2.putText(static_strip, "Exercise: Squat Analysis",
+                               (width - 400, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+                frame_with_overlay = canvases[canvas_slot]
+                canvas_slot = (canvas_slot + 1) % len(canvases)
+                frame_with_overlay[:frame_h] = frame
+                frame_with_overlay[frame_h:] = static_strip
+            
+                # Add info text to overlay
+                info_y_start = height + 20
+            
+                # Frame info
+                timestamp = frame_count / fps if fps > 0 else 0
+                cv2.putText(frame_with_overlay, f"Frame: {frame_count}/{total_frames}",
+                           (20, info_y_start), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
+                cv2.putText(frame_with_overlay, f"Time: {timestamp:.1f}s",
+                           (20, info_y_start + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
+            
+                # Detection info
+                detection_rate = (pose_detected_count / frame_count * 100) if frame_count > 0 else 0
+                cv2.putText(frame_with_overlay, f"Pose detected: {detection_rate:.1f}%",
+                           (20, info_y_start + 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, info_color, 2)
+            
+                # Angle legend
+                if angles_to_display:
+                    legend_x = width - 400
+                    legend_y = info_y_start + 50
+                    for i, (joint_name, angle, _) in enumerate(angles_to_display[:3]):  # Show first 3
+                        cv2.putText(frame_with_overlay, f"{joint_name}: {angle}°",
+                                   (legend_x, legend_y + i * 25), 
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, angle_color, 2)
+            
+                # Show video preview
+                if show or paused:
+                    cv2.imshow('Exercise Analysis - Skeleton Overlay', frame_with_overlay)
+            
+                # Write to output video if enabled. The writer thread may still hold the frame
+                # after this returns: decoded frames are fresh arrays, and an overlay canvas is not
+                # redrawn until the ring has come round, which stays safe only while the ring has
+                # WRITE_QUEUE_SIZE + 2 canvases (queued, being encoded, and the one drawn next)
+                if out is not None:
+                    out_thread.write(frame_with_overlay if show_preview else frame)
+            
+                # Handle keyboard input (only after the window was refreshed, or while paused)
+                if not (show or paused):
+                    continue
+                key = cv2.waitKey(1 if not paused else 0) & 0xFF
+            
+                if key == ord('q') or key == 27:  # 'q' or ESC
+                    log.write("\n⏹️  Stopping analysis...")
+                    break
+                elif key == ord('p'):  # 'p' to pause/resume
+                    paused = not paused
+                    log.write(f"   {'⏸️  Paused' if paused else '▶️  Resumed'}")
+                elif key == ord('s'):  # 's' to save screenshot
+                    screenshot_path = f"screenshot_frame_{frame_count}.jpg"
+                    cv2.imwrite(screenshot_path, frame_with_overlay if show_preview else frame)
+                    log.write(f"   💾 Saved screenshot: {screenshot_path}")
+                elif key == ord('f'):  # 'f' to skip forward 60 frames (2 seconds at 30fps)
+                    if not paused:
+                        new_pos = frame_count + SEEK_FRAMES
+                        if new_pos < total_frames:
+                            # Stop the reader thread before seeking, then read on from the new position
+                            frames.close()
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
+                            frames = read_frames(cap, maxsize=8)
+                            recent.clear()
+                            replay.clear()
+                            frame_count = new_pos
+                            log.write(f"   ⏩ Skipped forward 2 seconds")
+                elif key == ord('b'):  # 'b' to skip backward 60 frames
+                    if not paused:
+                        new_pos = max(0, frame_count - SEEK_FRAMES)
+                        steps = frame_count - new_pos
+                        if steps <= len(recent):
+                            # Step back through the kept frames; the reader carries on where it was
+                            for _ in range(steps):
+                                replay.append(recent.pop())
+                        else:
+                            frames.close()
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
+                            frames = read_frames(cap, maxsize=8)
+                            recent.clear()
+                            replay.clear()
+                        frame_count = new_pos
+                        log.write(f"   ⏪ Skipped backward 2 seconds")
+        finally:
+            # Join the inference and reader threads (and flush the console) before
+            # create_pose closes or resets the model they use
+            log.close()
+            if detections is not None:
+                detections.close()
+            frames.close()
     
     # Cleanup
     cap.release()
     if out is not None:
-        out.release()
-    pose.close()
+        try:
+            out_thread.close()
+        finally:
+            out.close()
     
     if show_preview:
         cv2.destroyAllWindows()
@@ -348,28 +412,28 @@ def analyze_video_with_skeleton(video_path, output_video=None, show_preview=True
     print("=" * 60)
     return frame_count
 
-def calculate_angle(a, b, c):
+def calculate_angles(a, b, c):
     """
-    Calculate the angle at point b formed by points a, b, c
+    Calculate the angle at b formed by a-b-c for each matching row of a, b, c,
+    in degrees (NaN where a point coincides with b)
     """
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    c = np.asarray(c, dtype=float)
     
     # Calculate vectors
     ba = a - b
     bc = c - b
     
     # Calculate cosine of angle
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
     
     # Handle floating point errors
     cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
     
     # Calculate angle in degrees
-    angle = np.degrees(np.arccos(cosine_angle))
-    
-    return int(round(angle))
+    return np.degrees(np.arccos(cosine_angle))
 
 def create_test_video():
     """
@@ -388,14 +452,18 @@ def create_test_video():
     test_video_path = 'test_squat_video.mp4'
     out = cv2.VideoWriter(test_video_path, fourcc, fps, (width, height))
     
-    for frame_idx in range(total_frames):
-        # Create blank frame
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
-        frame[:, :] = (40, 40, 40)  # Dark gray background
-        
-        # Calculate squat position (sin wave for up/down motion)
-        t = frame_idx / total_frames
-        squat_depth = np.sin(t * 4 * np.pi) * 0.4 + 0.5  # 0.1 to 0.9
+    # Dark gray background with the fixed text, drawn once and copied for every frame
+    background = np.full((height, width, 3), 40, dtype=np.uint8)
+    cv2.putText(background, "TEST VIDEO: Person Doing Squats", (50, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    cv2.putText(background, "MediaPipe will detect this skeleton", (50, 100),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
+    
+    # Squat position for every frame (sin wave for up/down motion), 0.1 to 0.9
+    squat_depths = np.sin(np.arange(total_frames) / total_frames * 4 * np.pi) * 0.4 + 0.5
+    
+    for frame_idx, squat_depth in enumerate(squat_depths.tolist()):
+        frame = background.copy()
         
         # Draw a simple stick figure doing squats
         center_x, center_y = width // 2, height // 2
@@ -448,12 +516,8 @@ def create_test_video():
         cv2.line(frame, (center_x, body_end_y), right_leg_end, (255, 255, 255), 3)
         
         # Add text
-        cv2.putText(frame, "TEST VIDEO: Person Doing Squats", (50, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
         cv2.putText(frame, f"Frame: {frame_idx}/{total_frames}", (50, 70),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
-        cv2.putText(frame, "MediaPipe will detect this skeleton", (50, 100),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
         
         out.write(frame)
     
@@ -469,10 +533,23 @@ def main():
     print("🎬 VIDEO SKELETON ANALYZER")
     print("=" * 50)
     
-    # Check command line arguments
-    if len(sys.argv) > 1:
-        video_path = sys.argv[1]
-        output_path = sys.argv[2] if len(sys.argv) > 2 else None
+    # Check command line arguments; --complexity N picks the pose model (0-2),
+    # --inference-size N the longest side of the frames it sees
+    args = sys.argv[1:]
+    model_complexity = 1
+    if "--complexity" in args:
+        i = args.index("--complexity")
+        model_complexity = int(args[i + 1])
+        del args[i:i + 2]
+    inference_size = INFERENCE_MAX_SIZE
+    if "--inference-size" in args:
+        i = args.index("--inference-size")
+        inference_size = int(args[i + 1])
+        del args[i:i + 2]
+    
+    if args:
+        video_path = args[0]
+        output_path = args[1] if len(args) > 1 else None
     else:
         # Look for video files in current directory
         video_files = []
@@ -519,7 +596,7 @@ def main():
     
     # Run analysis
     print("\n" + "=" * 50)
-    analyze_video_with_skeleton(video_path, output_path, show_preview)
+    analyze_video_with_skeleton(video_path, output_path, show_preview, model_complexity, inference_size)
     
     print("\n🎉 Analysis complete! Press Enter to exit...")
     input()
@@ -0,0 +1,237 @@
+"""
+Threaded frame decoding and pose inference for the analyzers
+"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+# Marks the end of a background stage's output
+_DONE = object()
+
+def _put(items, item, stop):
+    """Block until item is queued, giving up once the consumer has stopped"""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _background(produce, maxsize):
+    """
+    Run the generator returned by produce() on a background thread and yield
+    its items through a bounded queue. An exception in the thread is raised
+    again to the consumer.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    errors = []
+    
+    def worker():
+        source = produce()
+        try:
+            for item in source:
+                if not _put(items, item, stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            source.close()
+            _put(items, _DONE, stop)
+    
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+    
+    if errors:
+        raise errors[0]
+
+def open_capture(video_path):
+    """
+    Open a video for reading, asking OpenCV's FFmpeg backend for hardware
+    decoding (CUDA, QSV, VAAPI...) where the build and host support it.
+    OpenCV decodes in software when no accelerator is available.
+    """
+    try:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    except (AttributeError, cv2.error):
+        # OpenCV builds before 4.5.2 have no hardware acceleration properties
+        pass
+    return cv2.VideoCapture(video_path)
+
+def read_frames(cap, maxsize=16, skip=1):
+    """
+    Yield every skip-th frame from an opened cv2.VideoCapture.
+    Decoding runs ahead on a background thread into a bounded queue, so the
+    next frames are ready while the caller is busy with pose inference.
+    Skipped frames are only grabbed, never converted into an image.
+    """
+    def decode():
+        while True:
+            for _ in range(skip - 1):
+                if not cap.grab():
+                    return
+            if not cap.grab():
+                break
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield frame
+    
+    return _background(decode, maxsize)
+
+# Longest side of the frame passed to pose inference; BlazePose works on 256x256 input anyway
+INFERENCE_MAX_SIZE = 640
+
+def downscale_for_inference(image, max_size=INFERENCE_MAX_SIZE):
+    """Shrink a frame whose longer side exceeds max_size, keeping its aspect ratio"""
+    h, w = image.shape[:2]
+    scale = max_size / max(h, w)
+    if scale >= 1:
+        return image
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+# Mean absolute change of the motion thumbnail (0-255 grey levels) below which
+# the last landmarks are reused instead of running pose inference again
+MOTION_THRESHOLD = 2.0
+# Reused landmarks must have at least this mean visibility
+MIN_REUSE_VISIBILITY = 0.8
+# Inference is forced again after this many consecutive reused frames
+MAX_REUSED_POSES = 5
+
+def motion_thumbnail(image):
+    """Small greyscale copy of an RGB frame for cheap change detection"""
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+def pose_visibility(results):
+    """Mean visibility of the detected landmarks (0 when there is no pose)"""
+    if not results.pose_landmarks:
+        return 0.0
+    landmark = results.pose_landmarks.landmark
+    return sum(lm.visibility or 0.0 for lm in landmark) / len(landmark)
+
+def can_reuse_pose(results, thumbnail, inferred_thumbnail, reused):
+    """
+    Whether the last results (inferred on the frame with inferred_thumbnail and
+    already reused for the last `reused` frames) can stand for this frame too
+    """
+    return (results is not None and reused < MAX_REUSED_POSES
+            and np.abs(thumbnail - inferred_thumbnail).mean() < MOTION_THRESHOLD
+            and pose_visibility(results) >= MIN_REUSE_VISIBILITY)
+
+def skip_pose_frame(pose):
+    """
+    Tell a pose model that keeps its own clock (TaskPose in VIDEO mode) that a
+    frame went by without process(), so its next timestamp is not compressed
+    """
+    skip_frame = getattr(pose, "skip_frame", None)
+    if skip_frame is not None:
+        skip_frame()
+
+def pose_frames(frames, pose, stride=1, maxsize=8):
+    """
+    Yield (image_rgb, results) for each BGR frame.
+    Colour conversion and pose.process run on their own thread, so inference
+    overlaps with the caller drawing and encoding the previous frames; pose is
+    only ever used from that thread. Inference sees a downscaled copy of the
+    frame, and frames between strides reuse the landmarks from the last one.
+    A stride frame that has barely changed since the last inference also
+    reuses its landmarks while they are clearly visible, as during holds.
+    RGB frames are converted into a ring of reused buffers, one more than can
+    be queued or held by the caller, so each must be used before the next one.
+    """
+    def infer():
+        buffers = [None] * (maxsize + 2)
+        results = None
+        inferred_thumbnail = None
+        reused = 0
+        try:
+            for i, frame in enumerate(frames):
+                slot = i % len(buffers)
+                if buffers[slot] is None or buffers[slot].shape != frame.shape:
+                    buffers[slot] = np.empty_like(frame)
+                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffers[slot])
+                if i % stride == 0:
+                    small_rgb = downscale_for_inference(image_rgb)
+                    thumbnail = motion_thumbnail(small_rgb)
+                    if can_reuse_pose(results, thumbnail, inferred_thumbnail, reused):
+                        reused += 1
+                        skip_pose_frame(pose)
+                    else:
+                        # Landmarks are normalized, so they apply to the full-size frame as-is
+                        results = pose.process(small_rgb)
+                        inferred_thumbnail = thumbnail
+                        reused = 0
+                yield image_rgb, results
+        finally:
+            frames.close()
+    
+    return _background(infer, maxsize)
+
+def detect_frames(frames, pose, maxsize=8, max_size=INFERENCE_MAX_SIZE):
+    """
+    Yield (frame, results) for each BGR frame, with downscaling, colour
+    conversion and pose.process running on a background thread ahead of the
+    caller. Unlike pose_frames, every frame that has moved is inferred; a
+    barely changed one reuses the last landmarks as there. Frames are handed
+    back as decoded, so each must be a fresh array (as read_frames yields).
+    """
+    def infer():
+        rgb = None
+        results = None
+        inferred_thumbnail = None
+        reused = 0
+        try:
+            for frame in frames:
+                # Shrink before converting so only the small copy is converted
+                small = downscale_for_inference(frame, max_size)
+                if rgb is None or rgb.shape != small.shape:
+                    rgb = np.empty_like(small)
+                cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb)
+                thumbnail = motion_thumbnail(rgb)
+                if can_reuse_pose(results, thumbnail, inferred_thumbnail, reused):
+                    reused += 1
+                    skip_pose_frame(pose)
+                else:
+                    results = pose.process(rgb)
+                    inferred_thumbnail = thumbnail
+                    reused = 0
+                yield frame, results
+        finally:
+            frames.close()
+    
+    return _background(infer, maxsize)
+
+# Pose inference rate that is still plenty for counting human reps
+POSE_RATE_HZ = 15
+# Upper bound on frames sharing one inference
+MAX_POSE_STRIDE = 4
+
+def pose_stride(fps):
+    """
+    How many consecutive source frames one pose inference stands for at the
+    given FPS, either by sharing its landmarks or by skipping the rest.
+    Falls back to every frame when the reported FPS is unusable (e.g. some
+    browser-recorded webm files).
+    """
+    if not 0 < fps <= 120:
+        return 1
+    return min(max(1, round(fps / POSE_RATE_HZ)), MAX_POSE_STRIDE)
@@ -0,0 +1,186 @@
+"""
+Shared output video encoding for the analyzers
+"""
+
+import os
+import queue
+import subprocess
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+@lru_cache(maxsize=None)
+def nvenc_available():
+    """Probe once whether ffmpeg can encode with h264_nvenc on this machine"""
+    from moviepy.config import get_setting
+
+    try:
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-v', 'error', '-f', 'lavfi',
+             '-i', 'color=size=256x256:duration=0.1', '-c:v', 'h264_nvenc', '-f', 'null', '-'],
+            capture_output=True, timeout=10
+        )
+        return result.returncode == 0
+    except Exception:
+        return False
+
+class FFmpegPipe:
+    """
+    Raw RGB (or BGR, with pix_fmt='bgr24') frames piped into an ffmpeg process.
+    Same command line as MoviePy's FFMPEG_VideoWriter, but frames are written
+    from their own buffer instead of through a tobytes() copy.
+    """
+
+    def __init__(self, output_path, size, fps, codec_params, pix_fmt='rgb24'):
+        from moviepy.config import get_setting
+
+        cmd = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', '%dx%d' % size,
+               '-pix_fmt', pix_fmt, '-r', '%.02f' % fps, '-an', '-i', '-']
+        cmd.extend(codec_params)
+        cmd.append(output_path)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+        self.stderr = None
+
+    def ffmpeg_error(self):
+        """ffmpeg's error output, read once it has exited or closed its input"""
+        if self.stderr is None:
+            self.stderr = self.proc.stderr.read().decode(errors='replace').strip()
+        return self.stderr
+
+    def write_frame(self, frame):
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except OSError:
+            raise IOError(f"ffmpeg stopped accepting frames: {self.ffmpeg_error()}")
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        error = self.ffmpeg_error()
+        if self.proc.wait() != 0:
+            raise IOError(f"ffmpeg failed: {error}")
+
+def open_ffmpeg_writer(output_path, size, fps, pix_fmt='rgb24'):
+    """Open an ffmpeg pipe for RGB (or pix_fmt) frames, preferring NVENC over libx264"""
+    if nvenc_available():
+        return FFmpegPipe(output_path, size, fps,
+                          ['-vcodec', 'h264_nvenc', '-preset', 'p1', '-tune', 'll', '-pix_fmt', 'yuv420p'],
+                          pix_fmt)
+    
+    codec_params = ['-vcodec', 'libx264', '-preset', 'ultrafast', '-threads', '4']
+    # yuv420p keeps the output browser-playable; libx264 needs even dimensions for it
+    if size[0] % 2 == 0 and size[1] % 2 == 0:
+        codec_params += ['-pix_fmt', 'yuv420p']
+    return FFmpegPipe(output_path, size, fps, codec_params, pix_fmt)
+
+class VideoWriter:
+    """
+    Streams annotated RGB frames to ffmpeg as they are produced, so the
+    analyzers never hold the whole video in memory.
+    Real Time Coach recordings are the exception: their FPS is only known once
+    every frame has been counted, so those frames are buffered until close().
+    pix_fmt='bgr24' takes OpenCV's BGR frames as they are, and
+    coach_recordings=False streams every input at its own FPS.
+    """
+
+    def __init__(self, video_path, output_path, fps, pix_fmt='rgb24', coach_recordings=True):
+        self.output_path = output_path
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        is_coach_recording = coach_recordings and "recorded_video" in os.path.basename(video_path)
+        self.buffered = [] if is_coach_recording else None
+        self.writer = None
+        self.error = None
+
+    def write(self, frame):
+        """Encode one frame; the caller may reuse the array afterwards"""
+        if self.error is not None:
+            return
+
+        if self.buffered is not None:
+            self.buffered.append(frame.copy())
+            return
+
+        try:
+            if self.writer is None:
+                h, w = frame.shape[:2]
+                self.writer = open_ffmpeg_writer(self.output_path, (w, h), output_fps(self.fps), self.pix_fmt)
+            self.writer.write_frame(frame)
+        except Exception as e:
+            # Reported from close() so callers handle it like any other write failure
+            self.error = e
+
+    def close(self):
+        """Finish the output file, raising the first encoding error if any"""
+        if self.writer is not None:
+            self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+        if self.buffered:
+            # Fix for Real Time Coach video speed
+            fps = len(self.buffered) / 10.0
+            print(f"DEBUG: Detected Real Time Coach video. Corrected FPS: {fps}")
+
+            h, w = self.buffered[0].shape[:2]
+            writer = open_ffmpeg_writer(self.output_path, (w, h), output_fps(fps), self.pix_fmt)
+            try:
+                for frame in self.buffered:
+                    writer.write_frame(frame)
+            finally:
+                writer.close()
+            self.buffered = []
+
+class ThreadedWriter:
+    """
+    Hands frames to write(frame) on a background thread through a bounded
+    queue, so encoding overlaps with the caller's next frame. Frames must not
+    be modified by the caller after they are queued.
+    """
+
+    def __init__(self, write, maxsize=8):
+        self.frames = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(write,), daemon=True)
+        self.thread.start()
+
+    def _run(self, write):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    write(frame)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, frame):
+        """Queue one frame, blocking while the queue is full"""
+        self.frames.put(frame)
+
+    def close(self):
+        """Wait for every queued frame to be written, raising the first write error"""
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+def valid_fps(fps):
+    """Ensure FPS is valid"""
+    return fps if 0 < fps <= 120 else 30.0
+
+def output_fps(fps):
+    """
+    FPS handed to the encoder. NTSC-style rates (23.976, 29.97, 59.94 and their
+    halves after frame skipping) are snapped to the whole number they round to;
+    -r is passed with two decimals, so these never had an exact timebase anyway.
+    """
+    fps = valid_fps(fps)
+    rounded = round(fps)
+    return rounded if abs(fps - rounded) <= fps * 0.002 else fps
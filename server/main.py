@@ -1,10 +1,13 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import shutil
 import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 # Add current directory to path to allow imports
@@ -40,6 +43,8 @@ async def health_check():
 # Constants
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "outputs"
+# Read size when saving uploads; copyfileobj's default is 64 KB or less
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -51,6 +56,62 @@ def read_root():
 
 from fastapi import Request
 
+# Worker processes for video analysis, created on the first request
+ANALYSIS_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+analysis_pool = None
+
+def get_analysis_pool():
+    global analysis_pool
+    if analysis_pool is None:
+        analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+    return analysis_pool
+
+def reset_analysis_pool():
+    global analysis_pool
+    if analysis_pool is not None:
+        analysis_pool.shutdown(wait=False)
+        analysis_pool = None
+
+@app.on_event("shutdown")
+def shutdown_analysis_pool():
+    reset_analysis_pool()
+
+def save_upload(source, file_path):
+    """Copy an uploaded file to disk in large chunks"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, length=UPLOAD_CHUNK_SIZE)
+
+def run_analysis(exercise_type, file_path, output_path):
+    """Run the analyzer for exercise_type (called inside a worker process)"""
+    # Lazy import analyzers to avoid blocking server startup
+    if exercise_type == "squat":
+        print("DEBUG: Starting Squat Analysis...")
+        from core.squat_analyzer import analyze_squat_video
+        analysis_result = analyze_squat_video(file_path, output_path)
+    elif exercise_type == "pushup":
+        print("DEBUG: Starting Pushup Analysis...")
+        from core.pushup_analyzer import analyze_pushup_video
+        analysis_result = analyze_pushup_video(file_path, output_path)
+    elif exercise_type == "pullup":
+        print("DEBUG: Starting Pullup Analysis...")
+        from core.pullup_analyzer import analyze_pullup_video
+        analysis_result = analyze_pullup_video(file_path, output_path)
+    elif exercise_type == "deadlift":
+        print("DEBUG: Starting Deadlift Analysis...")
+        from core.deadlift_analyzer import analyze_deadlift_video
+        analysis_result = analyze_deadlift_video(file_path, output_path)
+    elif exercise_type == "benchpress":
+        print("DEBUG: Starting BenchPress Analysis...")
+        from core.bench_press_analyzer import analyze_bench_press_video
+        analysis_result = analyze_bench_press_video(file_path, output_path)
+    else:
+        # Fallback to squat if unknown
+        print(f"Unknown exercise type: {exercise_type}, defaulting to squat")
+        from core.squat_analyzer import analyze_squat_video
+        analysis_result = analyze_squat_video(file_path, output_path)
+    
+    return analysis_result
+
 @app.post("/analyze")
 async def analyze_video(
     request: Request,
@@ -58,10 +119,10 @@ async def analyze_video(
     exercise_type: str = Form("squat")
 ):
     try:
-        # 1. Save uploaded file
+        # 1. Save uploaded file (on a thread so the event loop keeps serving other requests)
         file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, save_upload, file.file, file_path)
 
         # 2. Define output path
         output_filename = f"analyzed_{Path(file.filename).stem}.mp4"
@@ -75,32 +136,15 @@ async def analyze_video(
         
         start_time = time.time()
         
-        # Lazy import analyzers to avoid blocking server startup
-        if exercise_type == "squat":
-            print("DEBUG: Starting Squat Analysis...")
-            from core.squat_analyzer import analyze_squat_video
-            analysis_result = analyze_squat_video(file_path, output_path)
-        elif exercise_type == "pushup":
-            print("DEBUG: Starting Pushup Analysis...")
-            from core.pushup_analyzer import analyze_pushup_video
-            analysis_result = analyze_pushup_video(file_path, output_path)
-        elif exercise_type == "pullup":
-            print("DEBUG: Starting Pullup Analysis...")
-            from core.pullup_analyzer import analyze_pullup_video
-            analysis_result = analyze_pullup_video(file_path, output_path)
-        elif exercise_type == "deadlift":
-            print("DEBUG: Starting Deadlift Analysis...")
-            from core.deadlift_analyzer import analyze_deadlift_video
-            analysis_result = analyze_deadlift_video(file_path, output_path)
-        elif exercise_type == "benchpress":
-            print("DEBUG: Starting BenchPress Analysis...")
-            from core.bench_press_analyzer import analyze_bench_press_video
-            analysis_result = analyze_bench_press_video(file_path, output_path)
-        else:
-            # Fallback to squat if unknown
-            print(f"Unknown exercise type: {exercise_type}, defaulting to squat")
-            from core.squat_analyzer import analyze_squat_video
-            analysis_result = analyze_squat_video(file_path, output_path)
+        # Analysis runs in a worker process so other uploads are not blocked
+        try:
+            analysis_result = await loop.run_in_executor(
+                get_analysis_pool(), run_analysis, exercise_type, file_path, output_path
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next request
+            reset_analysis_pool()
+            raise
             
         print(f"DEBUG: Analysis complete in {time.time() - start_time:.2f}s")
         
@@ -4,41 +4,35 @@ No credentials, just analysis
 """
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import time
 import os
 from datetime import datetime
 import json
+import sys
+from functools import lru_cache
 
-# Initialize MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Angle, overlay and inference helpers are shared with the web backend's analyzer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from core.landmarks import landmarks_array, draw_skeleton
+from core.pose_landmarker import create_pose
+from core.squat_analyzer import get_key_angles, add_angle_overlays, get_depth_rating
+from core.video_reader import open_capture, read_frames, downscale_for_inference, pose_stride
 
-# NSCA Squat Standards
-NSCA_STANDARDS = {
-    "knee_angle": {"optimal": 90, "range": (80, 100)},
-    "torso_lean": {"optimal": 45, "range": (40, 50)},
-    "hip_depth": {"optimal": "parallel"}
-}
+# Height of the info panel drawn below the video
+PANEL_HEIGHT = 100
 
-def calculate_angle(a, b, c):
-    """Calculate angle at point b formed by a-b-c"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-    
-    ba = a - b
-    bc = c - b
-    
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    
-    return int(np.degrees(np.arccos(cosine_angle)))
+# Every landmark gets a marker, as mp_drawing.draw_landmarks did
+ALL_JOINTS = range(33)
 
-def analyze_squat_video(video_path):
+# Highest rate at which the preview window is refreshed
+PREVIEW_FPS = 30
+
+def analyze_squat_video(video_path, model_complexity=1, preview=True):
     """
     Main analysis function - shows live preview and gives feedback
+    model_complexity=2 selects the slower Heavy pose model.
+    preview=False skips drawing and the window for batch runs.
     """
     print("=" * 60)
     print("QUICK SQUAT ANALYZER - LIVE PREVIEW + FEEDBACK")
@@ -50,7 +44,7 @@ def analyze_squat_video(video_path):
         return
     
     # Open video
-    cap = cv2.VideoCapture(video_path)
+    cap = open_capture(video_path)
     if not cap.isOpened():
         print("Cannot open video")
         return
@@ -66,9 +60,13 @@ def analyze_squat_video(video_path):
     print(f"Duration: {total_frames/fps:.1f}s")
     print("-" * 60)
     print("Starting live analysis...")
-    print("   Press 'Q' to quit | 'S' to screenshot | 'P' to pause")
+    if preview:
+        print("   Press 'Q' to quit | 'S' to screenshot | 'P' to pause")
     print("-" * 60)
     
+    # High frame rate videos only refresh the window at about PREVIEW_FPS
+    show_every = max(1, round(fps / PREVIEW_FPS)) if 0 < fps <= 240 else 1
+    
     # Data storage
     all_angles = []
     rep_data = []
@@ -76,66 +74,79 @@ def analyze_squat_video(video_path):
     in_squat = False
     rep_count = 0
     min_knee_angle = 180
+    canvas = None
     
-    # Setup MediaPipe
-    with mp_pose.Pose(
-        min_detection_confidence=0.7,
-        min_tracking_confidence=0.7,
-        model_complexity=2
-    ) as pose:
+    # Pose inference runs on every stride-th frame (~15 per second); the frames
+    # in between are still shown, with the landmarks of the last inference
+    stride = pose_stride(fps)
+    
+    # Setup MediaPipe (the GPU PoseLandmarker when POSE_LANDMARKER_MODEL is set)
+    with create_pose(fps, stride, model_complexity=model_complexity,
+                     min_detection_confidence=0.7,
+                     min_tracking_confidence=0.5) as pose:
         
         frame_count = 0
         paused = False
+        show = False
+        
+        # Decoding runs ahead on a background thread; the window stays on this one
+        frames = read_frames(cap, maxsize=4)
         
         while cap.isOpened():
             if not paused:
-                ret, frame = cap.read()
-                if not ret:
+                frame = next(frames, None)
+                if frame is None:
                     break
                 
                 frame_count += 1
+                show = preview and (frame_count - 1) % show_every == 0
                 
-                # Process frame
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-                results = pose.process(image)
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                # Process frame: the pose model gets a downscaled RGB copy, while drawing
+                # and the preview use the decoded BGR frame directly. Landmarks are
+                # normalized, so they apply to the full-size frame as-is.
+                inferred = (frame_count - 1) % stride == 0
+                if inferred:
+                    results = pose.process(cv2.cvtColor(downscale_for_inference(frame), cv2.COLOR_BGR2RGB))
                 
-                if results.pose_landmarks:
-                    # Draw skeleton
-                    mp_drawing.draw_landmarks(
-                        image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                        landmark_drawing_spec=mp_drawing.DrawingSpec(
-                            color=(0, 255, 0), thickness=2, circle_radius=2
-                        ),
-                        connection_drawing_spec=mp_drawing.DrawingSpec(
-                            color=(255, 255, 255), thickness=2
-                        )
-                    )
-                    
+                # Output canvas, reused every frame: the frame is copied into its top rows
+                # and the info panel is drawn into the bottom rows.
+                # Only frames that are shown get drawn.
+                frame_h, frame_w = frame.shape[:2]
+                if show:
+                    if canvas is None:
+                        canvas = np.empty((frame_h + PANEL_HEIGHT, frame_w, 3), dtype=np.uint8)
+                    image = canvas[:frame_h]
+                    image[:] = frame
+                
+                pose_landmarks = results.pose_landmarks
+                if pose_landmarks:
                     # Get landmarks
-                    landmarks = results.pose_landmarks.landmark
-                    h, w = image.shape[:2]
+                    landmarks = landmarks_array(pose_landmarks.landmark)
+                    
+                    # Draw skeleton
+                    if show:
+                        draw_skeleton(image, landmarks, ALL_JOINTS)
                     
                     # Calculate key angles
-                    angles = get_key_angles(landmarks, w, h)
+                    angles = get_key_angles(landmarks, frame_w, frame_h)
                     
-                    if angles['left_knee'] is not None:
-                        all_angles.append(angles['left_knee'])
-                        current_rep["angles"].append(angles['left_knee'])
+                    # Only fresh landmarks count towards reps and the feedback stats
+                    knee_angle = angles['left_knee']
+                    if inferred and knee_angle is not None:
+                        all_angles.append(knee_angle)
+                        current_rep["angles"].append(knee_angle)
                         current_rep["frames"].append(frame_count)
                         
                         # Detect squat reps
-                        if not in_squat and angles['left_knee'] < 150:
+                        if not in_squat and knee_angle < 150:
                             in_squat = True
                             min_knee_angle = 180
                         
                         if in_squat:
-                            if angles['left_knee'] < min_knee_angle:
-                                min_knee_angle = angles['left_knee']
+                            if knee_angle < min_knee_angle:
+                                min_knee_angle = knee_angle
                         
-                        if in_squat and angles['left_knee'] > 160:
+                        if in_squat and knee_angle > 160:
                             in_squat = False
                             rep_count += 1
                             rep_data.append({
@@ -146,15 +157,19 @@ def analyze_squat_video(video_path):
                             current_rep = {"frames": [], "angles": []}
                     
                     # Add angle displays
-                    image = add_angle_overlays(image, angles)
-                
-                # Add info panel
-                image = add_info_panel(image, frame_count, total_frames, fps, rep_count, min_knee_angle)
+                    if show:
+                        image = add_angle_overlays(image, angles)
                 
-                # Show live preview
-                cv2.imshow('LIVE SQUAT ANALYSIS - Press Q to quit', image)
+                if show:
+                    # Add info panel
+                    image = add_info_panel(canvas, frame_count, total_frames, fps, rep_count, min_knee_angle)
+                    
+                    # Show live preview
+                    cv2.imshow('LIVE SQUAT ANALYSIS - Press Q to quit', image)
             
-            # Handle keys
+            # Handle keys (only after the window was refreshed, or while paused)
+            if not (show or paused):
+                continue
             key = cv2.waitKey(1 if not paused else 0) & 0xFF
             
             if key == ord('q') or key == 27:
@@ -167,10 +182,13 @@ def analyze_squat_video(video_path):
                 screenshot = f"squat_frame_{frame_count}.jpg"
                 cv2.imwrite(screenshot, image)
                 print(f"Saved: {screenshot}")
+        
+        frames.close()
     
     # Cleanup
     cap.release()
-    cv2.destroyAllWindows()
+    if preview:
+        cv2.destroyAllWindows()
     
     # Generate and display feedback
     print("\n" + "=" * 60)
@@ -179,127 +197,47 @@ def analyze_squat_video(video_path):
     
     generate_feedback(rep_data, all_angles, video_path)
 
-def get_key_angles(landmarks, width, height):
-    """Extract key angles for squat analysis"""
-    def pixel_coord(idx):
-        lm = landmarks[idx]
-        return (int(lm.x * width), int(lm.y * height))
-    
-    angles = {}
-    
-    try:
-        # Left knee
-        l_hip = pixel_coord(23)
-        l_knee = pixel_coord(25)
-        l_ankle = pixel_coord(27)
-        angles['left_knee'] = calculate_angle(l_hip, l_knee, l_ankle)
-        
-        # Right knee
-        r_hip = pixel_coord(24)
-        r_knee = pixel_coord(26)
-        r_ankle = pixel_coord(28)
-        angles['right_knee'] = calculate_angle(r_hip, r_knee, r_ankle)
-        
-        # Torso lean
-        l_shoulder = pixel_coord(11)
-        r_shoulder = pixel_coord(12)
-        shoulder_mid = (
-            (l_shoulder[0] + r_shoulder[0]) // 2,
-            (l_shoulder[1] + r_shoulder[1]) // 2
-        )
-        hip_mid = (
-            (l_hip[0] + r_hip[0]) // 2,
-            (l_hip[1] + r_hip[1]) // 2
-        )
-        vertical_point = (hip_mid[0], hip_mid[1] - 100)
-        angles['torso'] = calculate_angle(vertical_point, hip_mid, shoulder_mid)
-        
-        # Hip angle
-        angles['left_hip'] = calculate_angle(l_shoulder, l_hip, l_knee)
-        angles['right_hip'] = calculate_angle(r_shoulder, r_hip, r_knee)
-        
-    except:
-        angles = {k: None for k in ['left_knee', 'right_knee', 'torso', 'left_hip', 'right_hip']}
-    
-    return angles
-
-def add_angle_overlays(image, angles):
-    """Add angle displays to frame"""
-    h, w = image.shape[:2]
-    
-    # Display angles at top
-    y_pos = 40
-    if angles['left_knee'] is not None:
-        # Color code based on NSCA standard
-        if 80 <= angles['left_knee'] <= 100:
-            color = (0, 255, 0)  # Green - good
-        elif 100 < angles['left_knee'] <= 120:
-            color = (0, 165, 255)  # Orange - shallow
-        else:
-            color = (0, 0, 255)  # Red - poor
-        
-        cv2.putText(image, f"Knee: {angles['left_knee']}° (NSCA: 90°)", 
-                   (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+@lru_cache(maxsize=256)
+def render_info_panel(w, reps, current_knee_angle):
+    """Render the info panel strip; cached since reps/knee rarely change between frames"""
+    panel = np.zeros((PANEL_HEIGHT, w, 3), dtype=np.uint8)
+    panel[:, :] = (40, 40, 40)
     
-    if angles['torso'] is not None:
-        torso_color = (0, 255, 0) if 40 <= angles['torso'] <= 50 else (0, 165, 255)
-        cv2.putText(image, f"Torso: {angles['torso']}° (Opt: 45°)", 
-                   (20, y_pos + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, torso_color, 2)
+    # Middle: Rep info
+    cv2.putText(panel, f"Reps: {reps}", 
+               (w//2 - 100, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    cv2.putText(panel, f"Current Knee: {current_knee_angle}°", 
+               (w//2 - 100, PANEL_HEIGHT - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
     
-    return image
+    # Right side: NSCA standard
+    cv2.putText(panel, "NSCA Standard:", 
+               (w - 250, PANEL_HEIGHT - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
+    cv2.putText(panel, "• Parallel depth (90° knee)", 
+               (w - 250, PANEL_HEIGHT - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Neutral spine", 
+               (w - 250, PANEL_HEIGHT - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    cv2.putText(panel, "• Knees over toes", 
+               (w - 250, PANEL_HEIGHT - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
+    
+    return panel
 
 def add_info_panel(image, frame, total_frames, fps, reps, current_knee_angle):
-    """Add information panel to frame"""
-    h, w = image.shape[:2]
-    
-    # Create bottom panel
-    panel_height = 100
-    panel = np.zeros((panel_height, w, 3), dtype=np.uint8)
-    panel[:, :] = (40, 40, 40)
+    """Draw the information panel into the bottom PANEL_HEIGHT rows of the frame"""
+    new_h, w = image.shape[:2]
     
-    # Add panel to image
-    image_with_panel = np.vstack([image, panel])
-    new_h = h + panel_height
+    # Reuse the cached strip; only the frame counter and time change every frame
+    image[new_h - PANEL_HEIGHT:] = render_info_panel(w, reps, current_knee_angle)
     
     # Add info
     time_sec = frame / fps if fps > 0 else 0
     
     # Left side: Basic info
-    cv2.putText(image_with_panel, f"Frame: {frame}/{total_frames}", 
+    cv2.putText(image, f"Frame: {frame}/{total_frames}", 
                (20, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    cv2.putText(image_with_panel, f"Time: {time_sec:.1f}s", 
+    cv2.putText(image, f"Time: {time_sec:.1f}s", 
                (20, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    # Middle: Rep info
-    cv2.putText(image_with_panel, f"Reps: {reps}", 
-               (w//2 - 100, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-    cv2.putText(image_with_panel, f"Current Knee: {current_knee_angle}°", 
-               (w//2 - 100, new_h - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
-    
-    # Right side: NSCA standard
-    cv2.putText(image_with_panel, "NSCA Standard:", 
-               (w - 250, new_h - 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 255), 1)
-    cv2.putText(image_with_panel, "• Parallel depth (90° knee)", 
-               (w - 250, new_h - 50), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Neutral spine", 
-               (w - 250, new_h - 35), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    cv2.putText(image_with_panel, "• Knees over toes", 
-               (w - 250, new_h - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 255, 150), 1)
-    
-    return image_with_panel
-
-def get_depth_rating(knee_angle):
-    """Rate squat depth"""
-    if knee_angle > 120:
-        return "Very Shallow"
-    elif knee_angle > 100:
-        return "Shallow"
-    elif knee_angle > 85:
-        return "Good (Parallel)"
-    elif knee_angle > 70:
-        return "Excellent"
-    else:
-        return "Very Deep"
+    return image
 
 def generate_feedback(rep_data, all_angles, video_path):
     """Generate comprehensive feedback based on analysis"""
@@ -334,11 +272,14 @@ def generate_feedback(rep_data, all_angles, video_path):
         
         print(f"   {symbol} Rep {i}: {angle}° - {rating}")
     
+    # Bottom angle of each rep, gathered once for the statistics below
+    depths = [rep["min_angle"] for rep in rep_data]
+    
     # Calculate statistics
     if all_angles:
-        avg_knee_angle = np.mean([rep["min_angle"] for rep in rep_data])
-        min_angle = min([rep["min_angle"] for rep in rep_data])
-        max_angle = max([rep["min_angle"] for rep in rep_data])
+        avg_knee_angle = np.mean(depths)
+        min_angle = min(depths)
+        max_angle = max(depths)
         
         print("\nOVERALL STATISTICS:")
         print("-" * 40)
@@ -356,7 +297,7 @@ def generate_feedback(rep_data, all_angles, video_path):
     
     # Generate personalized feedback
     if rep_data:
-        avg_depth = np.mean([rep["min_angle"] for rep in rep_data])
+        avg_depth = np.mean(depths)
         
         print("\nKEY FINDINGS:")
         print("-" * 40)
@@ -434,7 +375,8 @@ def generate_feedback(rep_data, all_angles, video_path):
 
 def save_quick_report(rep_data, video_path, avg_depth):
     """Save a quick text report"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     filename = f"squat_quick_report_{timestamp}.txt"
     
     with open(filename, 'w') as f:
@@ -443,7 +385,7 @@ def save_quick_report(rep_data, video_path, avg_depth):
         f.write("=" * 50 + "\n\n")
         
         f.write(f"Video: {os.path.basename(video_path)}\n")
-        f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
+        f.write(f"Date: {now.strftime('%Y-%m-%d %H:%M')}\n")
         f.write(f"Total Reps: {len(rep_data)}\n\n")
         
         f.write("Rep Details:\n")
@@ -477,33 +419,39 @@ def save_quick_report(rep_data, video_path, avg_depth):
 
 # Simple main function - no questions, just run
 if __name__ == "__main__":
-    # Check for video file
-    video_path = None
+    # Check for video files
+    video_paths = []
     
     # Look for common video files
     video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
     
-    # First check command line argument
-    import sys
-    if len(sys.argv) > 1:
-        video_path = sys.argv[1]
-        if not os.path.exists(video_path):
+    # First check command line arguments; --heavy uses the Heavy pose model and
+    # --no-preview analyzes without opening a window
+    args = [arg for arg in sys.argv[1:] if arg not in ("--heavy", "--no-preview")]
+    model_complexity = 2 if "--heavy" in sys.argv[1:] else 1
+    preview = "--no-preview" not in sys.argv[1:]
+    for video_path in args:
+        if os.path.exists(video_path):
+            video_paths.append(video_path)
+        else:
             print(f"Video not found: {video_path}")
-            video_path = None
     
     # If no command line arg, look in current directory
-    if not video_path:
+    if not video_paths:
         for file in os.listdir('.'):
             if any(file.lower().endswith(ext) for ext in video_extensions):
-                video_path = file
+                video_paths.append(file)
                 break
     
-    if video_path:
-        print(f"Found video: {video_path}")
-        analyze_squat_video(video_path)
+    if video_paths:
+        # Videos run one after another in this process, so the pose graph
+        # created for the first one is reused by the rest
+        for video_path in video_paths:
+            print(f"Found video: {video_path}")
+            analyze_squat_video(video_path, model_complexity, preview)
     else:
         print("No video file found!")
         print("\nPlease either:")
         print("1. Place a video file in this folder")
-        print("2. Run: python squat_analyzer.py your_video.mp4")
+        print("2. Run: python squat_analyzer.py your_video.mp4 [more_videos.mp4 ...] [--heavy] [--no-preview]")
         print("\nSupported formats: .mp4, .avi, .mov, .mkv, .webm")